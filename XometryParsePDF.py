@@ -4,300 +4,1901 @@
 # pyinstaller --onefile --add-data="templates/TravelerTemplate.xlsx;templates" XometryParsePDF.py
 
 import sys
-import PyPDF2
-import openpyxl
+import io
 import os
 import logging
 import re
 import shutil
-import numpy as np
-from datetime import datetime, timedelta
-from PIL import Image
-from openpyxl.drawing.spreadsheet_drawing import AbsoluteAnchor
-from openpyxl.drawing.xdr import XDRPoint2D, XDRPositiveSize2D
-from openpyxl.utils.units import pixels_to_EMU
-from win32com import client
-# Import win32api is not used in code but necessary for pyinstaller creation of .exe file.
-import win32api
+import subprocess
+import tempfile
+import zlib
+import hashlib
+import json
+import bisect
+import functools
+import math
+import mmap
+import pickle
+import csv
+import itertools
+import contextlib
+import dataclasses
+import sqlite3
+from pathlib import Path
+import argparse
+import queue
+import threading
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import concurrent.futures
+import multiprocessing
+from datetime import datetime
+
+# PyPDF2, openpyxl, numpy, PIL, asyncio and the win32 modules are imported by the functions using them, the first
+# time they are called, so starting the script (or unpacking the pyinstaller executable) does not wait for them.
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s.%(msecs)03d: %(message)s', datefmt='%H:%M:%S')
 logging.basicConfig(level=logging.INFO, format='%(asctime)s.%(msecs)03d: %(message)s', datefmt='%H:%M:%S')
 logging.disable(logging.DEBUG)  # uncomment to view debug log messages
 logging.disable(logging.INFO)  # uncomment to view info log messages
 
+# Document types returned by process_document.
+PURCHASE_ORDER = 'purchase_order'
+TRAVELER = 'traveler'
 
-def read_document(abs_folder_path):
-    """ Goes through and reads all files ending in '.pdf' in the given directory with PyPDF.
-        Depending on document content, calls the appropriate function to process. """
-    # Change working directory to provided path argument.
-    os.chdir(abs_folder_path)
-
-    # Pattern check for purchase orders.
-    po_regex = re.compile(r'.*(PURCHASE ORDER).*7951.*', re.DOTALL)
-
-    # Pattern check for travelers.
-    traveler_regex = re.compile(r'.*(Purchase Order)Due.*', re.DOTALL)
-
-    # Searches all files in the provided directory. Does not include folders.
-    for file in os.listdir('.'):
-        logging.debug(f'Checking file: {file}')
-
-        # Only interested in files that are PDF filetypes.
-        if file.endswith('.pdf'):
-
-            # Opens file with PyPDF2 and extracts information from the first page to determine document type.
-            logging.info(f'{file} is a PDF, opening contents to check document type.')
-            pdf_file_obj = open(file, 'rb')
-            pdf_reader = PyPDF2.PdfFileReader(pdf_file_obj)
-            page_obj = pdf_reader.getPage(0)
-            sort_page = page_obj.extractText()
-
-            # Closes file after extracting information needed.
-            pdf_file_obj.close()
-            logging.debug(f'read_document page 1 parse: \n{sort_page}')
-
-            po_match = po_regex.match(sort_page)
-            traveler_match = traveler_regex.match(sort_page)
-
-            # If initial characters match 'PURCHASE', file is a PO.
-            if po_match is not None:
-                logging.info(f'{file} is an Xometry Purchase Order')
-                purchase_order_process(file)
-
-            # If initial characters match 'Purchase', file is a Customer Traveler.
-            if traveler_match is not None:
-                logging.info(f'{file} is an Xometry Traveler')
-                traveler_process(file)
-
-
-def traveler_process(filename):
-    """ Opens traveler with PyPDF and sorts information into variables.
-        Passes appropriate variables into rename_drawings and rename_traveler. """
-    logging.info(f'Processing the following Xometry Traveler: {filename}')
-
-    # Regex pattern, probably the part that will need editing the most to fit all traveler patterns.
-    pattern = re.compile(r'''
-        .*?DateContact
-        ([a-zA-Z]\w{7})\n?                                                  # 1 PO Number
-        (\d\d/\d\d/\d\d\d\d)                                                # 2 Due Date
-        (.*?@.*?\.com)                                                      # 3 Contact
-        .*?
-        Quantity
-        (0\w{6})                                                            # 4 Part ID
-        (.*?)                                                               # 5 Part name
-        (\.\n?sldprt|\.\n?SLDPRT|\.\n?step|\.\n?STEP|\.\n?stp|\.\n?STP|\.\n?x_t|\.\n?s\n?tp|\.\n?prt)        # 6 Extension
-        .*?
-        (\d+)                                                               # 7 Quantity
-        .*?
-        tions
-        (.*?[a-z])                                                          # 8 Finish
-        (\n?[A-Z\d].*?)                                                     # 9 Material
-        (\n-.*?|Cert.*?)\n?                                                          # 10 Certifications
-        Inspection.*?[a-z]
-        ([A-Z].*?)                                                          # 11 Inspection Requirements
-        (Features:.*)                                                       # 12 Notes
-        ''', re.VERBOSE | re.DOTALL)
-
-    # Open traveler with PyPDF2, this time reading everything since we know it's the document we are looking for.
-    parse_string = open_parse_pdf(filename)
-
-    # Match traveler information into groups with regex
-    matches = pattern.match(parse_string)
-
-    # Create dictionary and sort matches into keys for passing into traveler creation.
-    traveler_dictionary = {}
+# Type of customer drawings in the records of process_folder.
+DRAWING = 'drawing'
 
-    logging.debug(f'PO Number is: {matches.group(1)}')
-    traveler_dictionary['po_number'] = matches.group(1)
+# Document type returned by process_document for a file that could not be parsed, the value is the error message.
+PARSE_ERROR = 'error'
 
-    logging.debug(f'Due Date is: {matches.group(2)}')
-    traveler_dictionary['due_date'] = matches.group(2)
+# Types of the generated files recorded in the folder manifest.
+WORKBOOK = 'workbook'
+EXPORTED_PDF = 'exported_pdf'
 
-    logging.debug(f'Contact is: {matches.group(3)}')
-    traveler_dictionary['contact'] = matches.group(3)
+# Section patterns used by extract_traveler_fields. None of them contain a lazy group that could backtrack.
+traveler_header_pattern = re.compile(r'DateContact([a-zA-Z]\w{7})\n?(\d\d/\d\d/\d\d\d\d)')
+traveler_part_pattern = re.compile(r'Quantity(0\w{6})')
+traveler_extension_pattern = re.compile(r'\.\n?(?:sldprt|SLDPRT|step|STEP|stp|STP|x_t|s\n?tp|prt)')
+traveler_quantity_pattern = re.compile(r'\d+')
+traveler_finish_end_pattern = re.compile(r'[a-z](?=\n?[A-Z\d])')
+traveler_certifications_pattern = re.compile(r'\n-|Cert')
+traveler_inspection_pattern = re.compile(r'[a-z](?=[A-Z])')
 
-    # Passes job number into rename_drawings and rename_traveler
-    logging.debug(f'Job Number is: {matches.group(4)}')
-    traveler_dictionary['job_number'] = matches.group(4)
-    job_number = matches.group(4)
+# Surface roughness patterns used by roughness_search.
+roughness_label_pattern = re.compile(r'Surface Roughness: \n')
+roughness_area_pattern = re.compile(r'Ra, (speci\nc area|entire part)')
+roughness_value_pattern = re.compile(r'ish (?=\d)')
 
-    # Sends filepath and job_number to grab image from pdf
-    image_grab(filename, job_number)
+# Notes patterns used by process_notes.
+notes_thread_pattern = re.compile(r'(Threads/Tapped Holes: \n)(\d+)', re.DOTALL)
+notes_insert_pattern = re.compile(r'Inserts:.*?(\d+)', re.DOTALL)
+notes_tolerance_pattern = re.compile(r'Tolerances: \n(.*?)\n', re.DOTALL)
+notes_marking_pattern = re.compile(r'Part Markings: \n(.*?)Notes:', re.DOTALL)
+notes_main_pattern = re.compile(r'Notes:(.*)', re.DOTALL)
 
-    logging.debug(f'Part File is: {matches.group(5) + matches.group(6)}')
-    traveler_dictionary['part_file'] = remove_newlines(matches.group(5) + matches.group(6))
+# Part ID (also used as Job Number) of purchase orders, found at most PO_PART_ID_MAX_GAP characters after 'Qty.'.
+# The longest match is PO_PART_ID_MAX_SPAN characters, so search_pdf only looks that far back on every new page.
+PO_PART_ID_MAX_GAP = 2000
+PO_PART_ID_MAX_SPAN = len('Qty.\n') + PO_PART_ID_MAX_GAP + len('0000000\n')
+po_part_id_pattern = re.compile(r'(Qty\.)(\n)(.{0,%d}?)(\w{7})(\n)' % PO_PART_ID_MAX_GAP, re.DOTALL)
+
+# Optional 'CT ' followed by any "filename.pdf or .PDF" format, for traveler renames.
+traveler_filename_pattern = re.compile(r'(CT )?(.*)(\.pdf|\.PDF)')
+
+# Mentions of Xometry replaced with 'CUSTOMER' in the notes of the excel traveler.
+customer_name_pattern = re.compile(r'xometry|Xometry|XOMETRY')
+
+# Lowercase letters against uppercase letters, a space is inserted between them by low_up.
+low_up_pattern = re.compile(r'([a-z](?=[A-Z])|[A-Z](?=[A-Z][a-z]))')
+
+# Characters PyPDF2 decodes with PDFDocEncoding where Xometry wrote Windows-1252 bullets and quotes.
+pdf_text_translation = str.maketrans({'Ł': None, '™': '\'', 'ﬂ': '"'})
+
+# Words missing the 'fi' ligature PyPDF2 drops when parsing the kerning, and their repaired spelling.
+# The case is kept, only the certifications field is capitalised, see traveler_process.
+ligature_fixes = {'certic': 'certific', 'Certic': 'Certific', 'specic': 'specific', 'Chem-lm': 'Chem-Film'}
+ligature_pattern = re.compile('|'.join(map(re.escape, ligature_fixes)))
+
+# Whitespace inside content stream hex strings.
+hex_whitespace_pattern = re.compile(rb'\s')
+
+# File in every processed folder recording which files were already handled, see Manifest.
+MANIFEST_NAME = '.xometry_manifest.json'
+
+# File holding the renames of a batch while they are applied, see RenameJournal.
+JOURNAL_NAME = '.xometry_renames.journal'
+
+# Print area of the excel traveler, exported to PDF by every export backend.
+PRINT_AREA = 'A1:C26'
+
+# Ending of the PDFs exported from the excel travelers, they are never read as travelers or POs.
+EXPORTED_PDF_SUFFIX = '_m.pdf'
+
+# Number of workbooks handed to a single LibreOffice invocation, keeps the command line under the Windows limit.
+LIBREOFFICE_BATCH_SIZE = 100
+
+# Seconds a LibreOffice invocation may take to start, plus seconds per workbook, before it is killed.
+# A first-run dialog or a locked profile otherwise leaves soffice, and the run waiting on it, hanging forever.
+LIBREOFFICE_TIMEOUT_SECONDS = 60
+LIBREOFFICE_WORKBOOK_SECONDS = 5
+
+# Decoded bytes of the first page content stream scanned by classify_document before it gives up.
+CLASSIFY_PREFIX_BYTES = 64 * 1024
+
+# Tokens of a content stream that matter for text: literal strings, hex strings and bare operator keywords.
+content_token_pattern = re.compile(
+    rb'(\((?:[^()\\]|\\.|\((?:[^()\\]|\\.)*\))*\))|<([0-9A-Fa-f\s]*)>|(?<![/\w.+-])([A-Za-z\'"][\w*\'"]*)',
+    re.DOTALL)
+
+# Escapes of PDF literal strings, see PDF reference 7.3.4.2.
+literal_escape_pattern = re.compile(rb'\\(\r\n|[0-7]{1,3}|.)', re.DOTALL)
+literal_escapes = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f',
+                   b'\r\n': b'', b'\r': b'', b'\n': b''}
+
+# Seconds a new file must keep the same size and mtime before the watch daemon processes it.
+WATCH_SETTLE_SECONDS = 2.0
+
+# Seconds between folder listings when the watch daemon cannot use inotify.
+WATCH_POLL_SECONDS = 2.0
+
+# Settled files waiting for a watch daemon worker, the dispatcher blocks while the queue is full.
+WATCH_QUEUE_SIZE = 64
+
+# Due date rules from customer instructions, in order of precedence, the first rule that matches sets the due date:
+# (fields searched, keywords, keyword must be the whole field, business days before the current due date).
+DUE_DATE_RULES = [
+    # Anything mentioning masking, heat treating or hardening.
+    (('finish', 'material', 'notes'), ('mask', 'MASK', 'heat treat', 'harden'), False, 7),
+    # A custom finish.
+    (('finish',), ('custom', 'Custom', 'CUSTOM'), False, 5),
+    # The standard finish.
+    (('finish',), ('Standard',), True, 2),
+]
+
+# Business days before the current due date when no rule matches, any other kind of finish.
+DUE_DATE_DEFAULT_DAYS = 3
+
+# Dates skipped by the business day arithmetic besides weekends, as 'YYYY-MM-DD' strings.
+DUE_DATE_HOLIDAYS = []
+
+# Size the extraction cache is kept under by evicting the least recently used entries.
+EXTRACTION_CACHE_MAX_BYTES = 256 * 2 ** 20
+
+# Key of the PDF stream in the info of a JPEG or JPEG 2000 preview image, and its mode in the extraction cache.
+ENCODED_PREVIEW = 'encoded_preview'
+
+# Version of the extraction cache entries, raise it whenever extraction changes so old entries are ignored.
+EXTRACTION_CACHE_VERSION = 3
+
+# Start of the batch summary filenames, excel_to_pdf does not export these workbooks.
+SUMMARY_PREFIX = 'Batch Summary'
+
+# Columns of the batch summary: (header, traveler dictionary key).
+SUMMARY_COLUMNS = [
+    ('Job Number', 'job_number'),
+    ('PO Number', 'po_number'),
+    ('Due Date', 'due_date'),
+    ('Adjusted Due Date', 'adjusted_due_date'),
+    ('ASAP', 'asap'),
+    ('Quantity', 'quantity'),
+    ('Material', 'material'),
+    ('Finish', 'finish'),
+    ('Certifications', 'certifications'),
+    ('Inspection', 'inspection'),
+    ('Part File', 'part_file'),
+    ('Contact', 'contact'),
+    ('Workbook', 'workbook'),
+]
+
+# Travelers whose due dates are adjusted together while writing the batch summary.
+SUMMARY_CHUNK_SIZE = 500
+
+# Images on the first page of a traveler this tall or shorter are logos, not the part preview.
+PREVIEW_MIN_HEIGHT = 100
+
+# Scale of the preview image in the excel traveler.
+PREVIEW_SCALE = 0.75
+
+# Memory of the pixel buffer prepare_previews reuses for a batch of previews of the same size, in bytes.
+# Batches hold as many previews as fit, but always at least one.
+PREVIEW_BATCH_BYTES = 64 * 2 ** 20
+
+# Results apply_results handles at a time, only the previews of one chunk are held as PNGs before their workbooks
+# are written.
+WORKBOOK_CHUNK_SIZE = 64
+
+# PIL mode and raw mode of image XObject pixels, by PIL mode of the color space and bits per component.
+# Rows of fewer than 8 bits per component are unpacked by PIL from whole bytes, like PDF stores them.
+image_raw_modes = {
+    ('RGB', 8): ('RGB', 'RGB'),
+    ('CMYK', 8): ('CMYK', 'CMYK'),
+    ('L', 8): ('L', 'L'),
+    ('L', 4): ('L', 'L;4'),
+    ('L', 2): ('L', 'L;2'),
+    ('L', 1): ('1', '1'),
+    ('P', 8): ('P', 'P'),
+    ('P', 4): ('P', 'P;4'),
+    ('P', 2): ('P', 'P;2'),
+    ('P', 1): ('P', 'P;1'),
+}
+
+# Files at least this large are memory mapped by PdfDocument instead of read, smaller ones are read in one call.
+MMAP_MIN_BYTES = 2 ** 20
+
+# Concurrent file reads and renames of read_document_async, also the most file contents held in memory at once.
+IO_CONCURRENCY = 16
+
+# Pickled traveler template workbook, cached by load_template the first time a traveler is created.
+_template_pickle = None
+
+
+class Metrics:
+    """ Per-stage timings and counters, written as one JSON object per line to a metrics file.
+        Off unless enable is called, then every timer and counter costs no more than checking the enabled flag.
+        Records made in worker processes are handed back to the main process, see call_with_metrics. """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.records = []
+        self.durations = {}
+        self.totals = {}
+
+        # Daemon worker threads add records at the same time.
+        self.lock = threading.Lock()
+
+    def enable(self, path=None):
+        """ Turns metrics on, records are appended to path by flush. Without a path they are only kept in memory. """
+        self.enabled = True
+        self.path = None if path is None else Path(path)
+
+    def add(self, record):
+        """ Buffers a record for the metrics file and adds it to the summary. """
+        with self.lock:
+            self.records.append(record)
+            if record['type'] == 'timer':
+                self.durations.setdefault(record['stage'], []).append(record['seconds'])
+            else:
+                self.totals[record['name']] = self.totals.get(record['name'], 0) + record['value']
+
+    def count(self, name, value=1, subject=None):
+        """ Adds value to the counter name, for example the pages extracted from a file. """
+        if self.enabled:
+            self.add({'type': 'counter', 'name': name, 'value': value, 'file': subject, 'time': time.time(),
+                      'pid': os.getpid()})
+
+    def drain(self):
+        """ Returns and forgets the buffered records, used by worker processes to hand them to the main process. """
+        with self.lock:
+            records, self.records = self.records, []
+            self.durations = {}
+            self.totals = {}
+        return records
+
+    def flush(self):
+        """ Appends the buffered records to the metrics file. """
+        with self.lock:
+            records, self.records = self.records, []
+        if self.path is not None and records:
+            with open(self.path, 'a', encoding='utf-8') as metrics_file:
+                metrics_file.writelines(json.dumps(record) + '\n' for record in records)
+
+    def summary(self):
+        """ Table of calls, total time and p50/p95/max latency of every stage, followed by the counter totals. """
+        with self.lock:
+            durations = {stage: sorted(seconds) for stage, seconds in self.durations.items()}
+            totals = dict(self.totals)
+        lines = [f'{"stage":<28}{"calls":>8}{"total s":>10}{"p50 ms":>10}{"p95 ms":>10}{"max ms":>10}']
+        for stage, seconds in sorted(durations.items()):
+            lines.append(f'{stage:<28}{len(seconds):>8}{sum(seconds):>10.3f}{percentile(seconds, 50) * 1000:>10.2f}'
+                         f'{percentile(seconds, 95) * 1000:>10.2f}{seconds[-1] * 1000:>10.2f}')
+        for name, total in sorted(totals.items()):
+            lines.append(f'{name:<28}{total:>8}')
+        return '\n'.join(lines)
+
+    def reset_summary(self):
+        with self.lock:
+            self.durations = {}
+            self.totals = {}
+
+
+# Timings and counters of this process, see Metrics and timed.
+metrics = Metrics()
+
+
+def timed(stage):
+    """ Decorator timing every call of a function as the given stage, only while metrics are enabled. """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.add({'type': 'timer', 'stage': stage, 'seconds': time.perf_counter() - start,
+                             'file': metric_subject(args), 'time': time.time(), 'pid': os.getpid()})
+        return wrapper
+    return decorator
+
+
+def metric_subject(args):
+    """ Name of the file, job or folder a timed call worked on, taken from its first argument. """
+    if not args:
+        return None
+    subject = args[0]
+    if isinstance(subject, dict):
+        return subject.get('job_number')
+    if isinstance(subject, PdfDocument):
+        subject = subject.path
+    elif isinstance(subject, FolderIndex):
+        subject = subject.folder_path
+    if isinstance(subject, (str, Path)):
+        return Path(subject).name
+    return None
+
+
+def percentile(sorted_values, percent):
+    """ Nearest-rank percentile of an already sorted list. """
+    rank = max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def init_worker(metrics_enabled, cache_path):
+    """ Process pool initializer, worker processes keep their metric records in memory for call_with_metrics
+        and use the same extraction cache as the main process. """
+    # Forked workers start with a copy of the records the main process has not flushed yet.
+    metrics.drain()
+    if metrics_enabled:
+        metrics.enable()
+    extraction_cache.path = cache_path
+
+
+def call_with_metrics(function, *args):
+    """ Runs function in a worker process, returning its result with the metric records made while it ran.
+        The main process adds them with merge_worker_result, so only one process ever writes the metrics file. """
+    result = function(*args)
+    return result, metrics.drain()
+
+
+def merge_worker_result(result_and_records):
+    """ Adds the records of call_with_metrics to the metrics of this process and returns the result. """
+    result, records = result_and_records
+    for record in records:
+        metrics.add(record)
+    return result
+
+
+class ExtractionCache:
+    """ On-disk cache of what process_document extracted from a PDF, keyed by the SHA-256 of its content.
+        Holds the document type, the traveler dictionary or PO job number and the preview image bytes,
+        so a PDF dropped again under any filename is never parsed again. Backed by SQLite so worker
+        processes can share it, least recently used entries are evicted once it grows past max_bytes. """
+
+    def __init__(self, path, max_bytes=EXTRACTION_CACHE_MAX_BYTES):
+        self.path = None if path is None else Path(path)
+        self.max_bytes = max_bytes
+        self._connection = None
+        self._pid = None
+
+        # Daemon worker threads share the connection of their process.
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """ Opens the database the first time it is used in this process, None when the cache is turned off. """
+        if self.path is None:
+            return None
+        # Connections can not be shared with forked worker processes, every process opens its own.
+        if self._connection is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._pid = os.getpid()
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            # Caches written before the extracted text was dropped still have a text column, it is left empty.
+            self._connection.execute('CREATE TABLE IF NOT EXISTS extractions (sha256 TEXT PRIMARY KEY, '
+                                     'version INTEGER, document_type TEXT, value TEXT, preview BLOB, '
+                                     'size INTEGER, last_used REAL)')
+        return self._connection
+
+    def get(self, sha256):
+        """ Returns (document type, traveler dictionary or PO job number) for a content hash, None on a miss. """
+        try:
+            with self.lock:
+                connection = self.connect()
+                if connection is None:
+                    return None
+                row = connection.execute('SELECT document_type, value, preview FROM extractions '
+                                         'WHERE sha256 = ? AND version = ?',
+                                         (sha256, EXTRACTION_CACHE_VERSION)).fetchone()
+                if row is None:
+                    metrics.count('cache_misses')
+                    return None
+                with connection:
+                    connection.execute('UPDATE extractions SET last_used = ? WHERE sha256 = ?', (time.time(), sha256))
+        except sqlite3.Error as e:
+            logging.info(f'Extraction cache unavailable: {e}')
+            return None
+
+        from PIL import Image
+
+        metrics.count('cache_hits')
+        document_type, value, preview = row
+        value = json.loads(value)
+        if document_type == TRAVELER:
+            # The preview is stored as its raw pixels or its JPEG stream, the dictionary only holds its mode and size.
+            image = value['image']
+            if image is None:
+                value['image'] = None
+            elif image[0] == ENCODED_PREVIEW:
+                value['image'] = Image.open(io.BytesIO(preview))
+                value['image'].info[ENCODED_PREVIEW] = preview
+            else:
+                value['image'] = Image.frombytes(image[0], tuple(image[1]), zlib.decompress(preview))
+        return document_type, value
+
+    def put(self, sha256, document_type, value):
+        """ Stores what was extracted from a PDF, then evicts the least recently used entries if needed. """
+        preview = None
+        if document_type == TRAVELER:
+            image = value['image']
+            if image is None:
+                value = dict(value, image=None)
+            elif ENCODED_PREVIEW in image.info:
+                # JPEG previews are stored as the stream from the PDF, their pixels are not decoded to store them.
+                value = dict(value, image=[ENCODED_PREVIEW, list(image.size)])
+                preview = image.info[ENCODED_PREVIEW]
+            else:
+                # Only the pixels are stored, a palette image is kept as the RGB pixels it stands for.
+                if image.mode == 'P':
+                    image = image.convert('RGB')
+                value = dict(value, image=[image.mode, list(image.size)])
+                preview = zlib.compress(image.tobytes())
+        value = json.dumps(value)
+        size = len(value) + len(preview or b'')
+        try:
+            with self.lock:
+                connection = self.connect()
+                if connection is None:
+                    return
+                with connection:
+                    connection.execute('INSERT OR REPLACE INTO extractions (sha256, version, document_type, value, '
+                                       'preview, size, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                       (sha256, EXTRACTION_CACHE_VERSION, document_type, value, preview, size,
+                                        time.time()))
+                    self.evict(connection)
+        except sqlite3.Error as e:
+            logging.info(f'Extraction cache unavailable: {e}')
+
+    def evict(self, connection):
+        """ Deletes the least recently used entries until the cache is back under max_bytes. """
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM extractions').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for sha256, size in connection.execute('SELECT sha256, size FROM extractions ORDER BY last_used'):
+            if total <= self.max_bytes:
+                break
+            evicted.append((sha256,))
+            total -= size
+        connection.executemany('DELETE FROM extractions WHERE sha256 = ?', evicted)
+        metrics.count('cache_evictions', len(evicted))
+
+
+def default_cache_path():
+    """ Extraction cache in the local application data folder on Windows, the user cache folder elsewhere. """
+    if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+        return Path(os.environ['LOCALAPPDATA']) / 'XometryParsePDF' / 'extraction_cache.sqlite3'
+    cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(cache_home) / 'xometry_parse_pdf' / 'extraction_cache.sqlite3'
+
+
+# Extraction cache of this process, turned off with --no-cache.
+extraction_cache = ExtractionCache(default_cache_path())
+
+
+class PdfDocument:
+    """ A PDF read from disk once and parsed once by PyPDF2, only when something is needed from it.
+        Shared by classification, text parsing and image extraction so the xref is only parsed a single time.
+        Large files are memory mapped, close the document (or use it in a with statement) once done with it. """
+
+    def __init__(self, path, data=None):
+        self.path = Path(path)
+        self.filename = self.path.name
+
+        # Small files are read in one go, large ones are mapped so every stage reads the same pages of the
+        # page cache and attachments the parser never looks at are not copied into memory.
+        # The handle is closed either way, the mapping does not need it.
+        # The content may also be handed over already read, see read_document_async.
+        if data is None:
+            with open(self.path, 'rb') as pdf_file_obj:
+                size = os.fstat(pdf_file_obj.fileno()).st_size
+                if size >= MMAP_MIN_BYTES:
+                    data = mmap.mmap(pdf_file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+                    metrics.count('bytes_mapped', size, self.filename)
+                else:
+                    data = pdf_file_obj.read()
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        metrics.count('bytes_read', len(data), self.filename)
+        self._data = data
+        self._reader = None
+        self._page_text = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """ Unmaps a mapped file, Windows does not allow renaming a file while it is mapped. """
+        if isinstance(self._data, mmap.mmap):
+            self._reader = None
+            self._data.close()
+
+    @property
+    def reader(self):
+        """ PyPDF2 reader of the document, the xref is parsed on first use so cache hits never parse it.
+            A mapped file is read by PyPDF2 in place, it only needs read, seek and tell. """
+        if self._reader is None:
+            import PyPDF2
+            stream = self._data if isinstance(self._data, mmap.mmap) else io.BytesIO(self._data)
+            self._reader = PyPDF2.PdfFileReader(stream)
+        return self._reader
+
+    @property
+    def num_pages(self):
+        return self.reader.numPages
+
+    def page_text(self, index):
+        """ Extracts the text of a single page, only once. """
+        if index not in self._page_text:
+            self._page_text[index] = self.reader.getPage(index).extractText()
+            metrics.count('pages_extracted', 1, self.filename)
+        return self._page_text[index]
+
+    def iter_page_text(self):
+        """ Yields the text of each page in order, a page is only extracted once the consumer asks for it. """
+        for index in range(self.num_pages):
+            yield self.page_text(index)
+
+    def text(self):
+        """ Extracts the text of every page and joins them together. """
+        return ''.join(self.iter_page_text())
+
+    def page0_content_prefix(self, limit):
+        """ Decodes at most limit bytes of the first page content stream(s), without parsing them.
+            Returns the bytes and whether the content was cut short. """
+        contents = self.reader.getPage(0).get('/Contents')
+        if contents is None:
+            return b'', False
+        contents = contents.getObject()
+        streams = [stream.getObject() for stream in contents] if isinstance(contents, list) else [contents]
+
+        prefix = b''
+        for stream in streams:
+            remaining = limit - len(prefix)
+            if remaining <= 0:
+                return prefix, True
+            stream_filter = stream.get('/Filter')
+            if stream_filter == '/FlateDecode' and '/DecodeParms' not in stream:
+                # Only inflate as much as needed, the rest of a long stream is never decompressed.
+                decompressor = zlib.decompressobj()
+                prefix += decompressor.decompress(stream._data, remaining)
+                if decompressor.unconsumed_tail:
+                    return prefix, True
+            elif stream_filter is None:
+                prefix += stream._data[:remaining]
+            else:
+                prefix += stream.getData()[:remaining]
+        return prefix, len(prefix) >= limit
+
+    def page0_images(self):
+        """ Returns a dictionary of the image XObjects on the first page, keyed by XObject name. """
+        page0 = self.reader.getPage(0)
+        if '/XObject' not in page0['/Resources']:
+            return {}
+        xobject = page0['/Resources']['/XObject'].getObject()
+        return {obj: xobject[obj] for obj in xobject if xobject[obj]['/Subtype'] == '/Image'}
 
-    logging.debug(f'Quantity is: {matches.group(7)}')
-    traveler_dictionary['quantity'] = matches.group(7)
 
-    logging.debug(f'Finish is: {matches.group(8)}')
-    traveler_dictionary['finish'] = regex_film_check(matches.group(8))
+class FolderIndex:
+    """ A single scan of a folder, used to plan every rename without listing the folder again.
+        Drawings still carrying their long alphanumeric are indexed by part ID (job number), and the set of
+        occupied names is kept up to date as renames are planned so free names never touch the filesystem. """
 
-    logging.debug(f'Material is: {matches.group(9)}')
-    traveler_dictionary['material'] = matches.group(9)
+    # Pattern that looks for files with a Job_Number, drawing, and drawing filetype.
+    drawing_pattern = re.compile(r'(.*)(_r_drawing_d_)(.*)(r_\w).*(\.pdf|\.jpg|\.jpeg|\.PDF|\.JPG|\.JPEG)')
 
-    logging.debug(f'Certifications required are: {matches.group(10)}')
-    traveler_dictionary['certifications'] = regex_certificate_check(low_up(remove_newlines(matches.group(10))))
+    def __init__(self, folder_path):
+        self.folder_path = Path(folder_path)
+        self.filenames = []
+        self.occupied = set()
+        self.drawings = {}
+        self.renames = []
 
-    logging.debug(f'Inspection requirements are: {matches.group(11)}')
-    traveler_dictionary['inspection'] = low_up(remove_newlines(matches.group(11)))
+        # Next counter to try for a drawing name, keyed by the name without counter so probing starts where it left.
+        self._counters = {}
 
-    logging.debug(f'Notes are: {matches.group(12)}')
-    traveler_dictionary['notes'] = matches.group(12)
+        # Searches all files in the provided directory. Does not include folders.
+        with os.scandir(self.folder_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    self.filenames.append(entry.name)
+        self.filenames.sort()
+        self.occupied.update(self.filenames)
 
-    # Rename drawings after we have the provided Job Number.
-    logging.info(f'Sending {job_number} to "rename_drawings"')
-    rename_drawings(job_number)
+        for filename in self.filenames:
+            self.index_drawing(filename)
 
-    # Rename travelers after we have the provided Job Number and Traveler filename.
-    logging.info(f'Sending {filename} and {job_number} to "rename_traveler"')
-    rename_traveler(filename, job_number)
+    def index_drawing(self, filename):
+        """ Indexes a drawing that still needs renaming by its part ID, which is returned. None for other files. """
+        matches = self.drawing_pattern.search(filename)
 
-    logging.info(f'traveler_dictionary contains the following: \n{traveler_dictionary}')
-    logging.info(f'Sending traveler information to create_excel.')
-    create_excel(traveler_dictionary, os.getcwd())
+        # If orig_filename does not have the long alphanumeric, it means file has already been renamed, skips.
+        if matches is None:
+            return None
+        if matches.group(3) == '':
+            logging.info(f'{filename} already renamed. Skipping.')
+            return None
+        drawings = self.drawings.setdefault(matches.group(1), [])
+        if all(drawing.group(0) != matches.group(0) for drawing in drawings):
+            drawings.append(matches)
+        return matches.group(1)
+
+    def add(self, filename):
+        """ Adds a file that appeared after the folder was scanned, returns its part ID if it is a drawing. """
+        self.occupied.add(filename)
+        return self.index_drawing(filename)
+
+    def discard(self, filename):
+        """ Forgets a file that was removed from the folder after it was scanned. """
+        self.occupied.discard(filename)
+
+    @staticmethod
+    def is_document(filename):
+        """ True for a PDF that may be a traveler or PO. The PDFs exported from the excel travelers are left out
+            by name, their text starts like a traveler and the manifest is not there to skip them on a rescan. """
+        return filename.endswith('.pdf') and not filename.endswith(EXPORTED_PDF_SUFFIX)
+
+    def pdf_files(self):
+        """ Returns the paths of every file ending in '.pdf' except the exported travelers, in filename order. """
+        return [self.folder_path / filename for filename in self.filenames if self.is_document(filename)]
+
+    def free_drawing_name(self, base, extension):
+        """ Creates a drawing name that is not taken, appending an incrementing number just before file extension. """
+        counter = self._counters.get((base, extension), 1)
+        new_file_name = base + ' (' + str(counter) + ')' + extension
+        while new_file_name in self.occupied:
+            counter += 1
+            new_file_name = base + ' (' + str(counter) + ')' + extension
+        self._counters[(base, extension)] = counter + 1
+        return new_file_name
+
+    def rename(self, orig_filename, new_file_name):
+        """ Plans a rename, the folder itself is only touched by apply_renames. Names are only planned once free,
+            so a rename whose new name was freed by another rename is always planned after that one. """
+        logging.info(f'Planning rename of "{orig_filename}" TO "{new_file_name}"')
+        self.occupied.discard(orig_filename)
+        self.occupied.add(new_file_name)
+        self.renames.append((orig_filename, new_file_name))
+
+    @timed('apply_renames')
+    def apply_renames(self):
+        """ Moves every planned rename as one batch, in the order they were planned.
+            The batch is written to a RenameJournal first, so a crash part way is finished by recover_renames. """
+        if self.renames:
+            journal = RenameJournal(self.folder_path)
+            journal.begin(self.renames)
+            for position, (orig_filename, new_file_name) in enumerate(self.renames):
+                logging.info(f'Renaming "{orig_filename}" TO "{new_file_name}"')
+                os.replace(self.folder_path / orig_filename, self.folder_path / new_file_name)
+                journal.mark(position)
+            journal.finish()
+        metrics.count('renames', len(self.renames), self.folder_path.name)
+        self.renames = []
+
+    async def apply_renames_async(self, concurrency=IO_CONCURRENCY):
+        """ Moves every planned rename like apply_renames, with up to concurrency renames in flight at once.
+            A rename to a name that an earlier planned rename frees has to wait for it, those are moved
+            one at a time in planned order once the others are done. """
+        import asyncio
+
+        if not self.renames:
+            return
+        journal = RenameJournal(self.folder_path)
+        await asyncio.to_thread(journal.begin, self.renames)
+        sources = {orig_filename for orig_filename, _ in self.renames}
+        independent = [(position, rename) for position, rename in enumerate(self.renames) if rename[1] not in sources]
+        dependent = [(position, rename) for position, rename in enumerate(self.renames) if rename[1] in sources]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def move(position, rename):
+            orig_filename, new_file_name = rename
+            async with semaphore:
+                logging.info(f'Renaming "{orig_filename}" TO "{new_file_name}"')
+                await asyncio.to_thread(os.replace, self.folder_path / orig_filename, self.folder_path / new_file_name)
+                await asyncio.to_thread(journal.mark, position)
+
+        await asyncio.gather(*(move(*rename) for rename in independent))
+        for rename in dependent:
+            await move(*rename)
+        await asyncio.to_thread(journal.finish)
+        metrics.count('renames', len(self.renames), self.folder_path.name)
+        self.renames = []
+
+
+class RenameJournal:
+    """ The renames of a batch, saved as JOURNAL_NAME inside the folder before any file is moved.
+        The first line holds every planned rename, a line is appended for each one once it is done, and the journal
+        is removed when the batch is complete. A journal still in the folder means the batch was interrupted,
+        recover_renames then finishes or undoes it from the journal alone, without scanning the folder. """
+
+    def __init__(self, folder_path):
+        self.folder_path = Path(folder_path)
+        self.path = self.folder_path / JOURNAL_NAME
+        self.renames = []
+        self.done = set()
+        self._file = None
+
+        # Renames applied concurrently mark their progress from several threads.
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, folder_path):
+        """ Reads the journal of an interrupted batch, None if the folder has none. """
+        journal = cls(folder_path)
+        try:
+            with open(journal.path, 'r', encoding='utf-8') as journal_file:
+                lines = journal_file.read().splitlines()
+        except FileNotFoundError:
+            return None
+
+        # The plan is written in full before the journal exists, only the last progress line can be cut short.
+        journal.renames = [tuple(rename) for rename in json.loads(lines[0])['renames']]
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if 'done' in entry:
+                journal.done.add(entry['done'])
+            else:
+                journal.done.discard(entry['undone'])
+        return journal
+
+    def begin(self, renames):
+        """ Writes the plan to a temporary file first and syncs it, so the journal is never half a plan. """
+        self.renames = list(renames)
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as journal_file:
+            json.dump({'version': 1, 'renames': self.renames}, journal_file)
+            journal_file.write('\n')
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def mark(self, position, state='done'):
+        """ Appends that the rename at position in the plan is done, or 'undone' when rolled back. """
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps({state: position}) + '\n')
+            self._file.flush()
+            if state == 'done':
+                self.done.add(position)
+            else:
+                self.done.discard(position)
+
+    def finish(self):
+        """ Removes the journal once every rename is done or undone. """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.remove(self.path)
+
+    def replay(self):
+        """ Moves every rename of the plan not marked done, in planned order. Returns the number moved.
+            A rename is only moved while its file is still there and its new name is free, one that was moved
+            without being marked is marked, and anything else is logged and left alone so no file is replaced. """
+        moved = 0
+        for position, (orig_filename, new_file_name) in enumerate(self.renames):
+            if position in self.done:
+                continue
+            source = self.folder_path / orig_filename
+            target = self.folder_path / new_file_name
+            if source.exists() and not target.exists():
+                logging.info(f'Finishing rename of "{orig_filename}" TO "{new_file_name}"')
+                os.replace(source, target)
+                self.mark(position)
+                moved += 1
+            elif target.exists() and not source.exists():
+                self.mark(position)
+            else:
+                logging.warning(f'Can not finish renaming "{orig_filename}" TO "{new_file_name}", left as is.')
+        return moved
+
+    def roll_back(self):
+        """ Moves every done rename back to its original name, in reverse planned order. Returns the number moved.
+            Renames that were not done, or whose original name was taken since, are logged and left alone. """
+        moved = 0
+        for position in reversed(range(len(self.renames))):
+            orig_filename, new_file_name = self.renames[position]
+            source = self.folder_path / orig_filename
+            target = self.folder_path / new_file_name
+            if target.exists() and not source.exists():
+                logging.info(f'Undoing rename of "{orig_filename}" TO "{new_file_name}"')
+                os.replace(target, source)
+                self.mark(position, 'undone')
+                moved += 1
+            elif position in self.done or not source.exists():
+                logging.warning(f'Can not undo renaming "{orig_filename}" TO "{new_file_name}", left as is.')
+        return moved
+
+
+@timed('recover_renames')
+def recover_renames(folder_path, rollback=False):
+    """
+    Finishes the rename batch of a run that was interrupted in the folder, from the journal it left behind.
+    Only the files named in the journal are looked at, the rest of the folder is not listed.
+    :folder_path: path to the folder
+    :rollback: move the renames that were done back to their original names instead
+    :return: number of files moved, 0 if no batch was interrupted
+    """
+    journal = RenameJournal.load(folder_path)
+    if journal is None:
+        return 0
+    logging.info(f'Recovering an interrupted batch of {len(journal.renames)} renames in {folder_path}')
+    moved = journal.roll_back() if rollback else journal.replay()
+    journal.finish()
+    metrics.count('renames_recovered', moved, Path(folder_path).name)
+    return moved
+
+
+class Manifest:
+    """ Record of every file already handled in a folder, saved as MANIFEST_NAME inside the folder.
+        Each entry holds the hash (None for drawings), size and mtime of the file, its document type and the outputs
+        made from it, so an unchanged file with all of its outputs present is skipped without being opened. """
+
+    def __init__(self, folder_path):
+        self.path = Path(folder_path) / MANIFEST_NAME
+        self.files = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as manifest_file:
+                self.files = json.load(manifest_file)['files']
+        except (OSError, ValueError, KeyError):
+            logging.info(f'No usable manifest in {folder_path}, every file will be processed.')
+
+    def is_current(self, path, occupied):
+        """ True if the file was handled before, has not changed since and all of its outputs still exist.
+            Size and mtime are compared first, the file is only hashed when its mtime changed but not its size. """
+        entry = self.files.get(path.name)
+        if entry is None or not all(output in occupied for output in entry['outputs']):
+            return False
+        stat = path.stat()
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns != entry['mtime']:
+            if entry['sha256'] is None or file_sha256(path) != entry['sha256']:
+                return False
+            entry['mtime'] = stat.st_mtime_ns
+        return True
+
+    def record(self, path, document_type, outputs, sha256=None, hashed=True):
+        """ Records a handled file, with the names of the files made from it.
+            The file is hashed unless sha256 is given, or hashed is False to record it by size and mtime only. """
+        stat = path.stat()
+        self.files[path.name] = {
+            'sha256': sha256 or (file_sha256(path) if hashed else None),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'type': document_type,
+            'outputs': outputs,
+        }
+
+    def rename(self, orig_filename, new_file_name):
+        if orig_filename in self.files:
+            self.files[new_file_name] = self.files.pop(orig_filename)
+
+    def save(self):
+        """ Writes the manifest to a temporary file first, so a crash never leaves half a manifest behind. """
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump({'version': 1, 'files': self.files}, manifest_file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+def file_sha256(path):
+    """ Hex SHA-256 of a file, read in blocks. """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file_obj:
+        for block in iter(lambda: file_obj.read(1 << 20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+@timed('read_document')
+def read_document(folder_path, jobs=1, rescan=False, summary_format=None, io_concurrency=None, dry_run=False):
+    """ Goes through and reads all files ending in '.pdf' in the given directory with PyPDF.
+        Documents are classified and parsed first, with a pool of worker processes when jobs is not 1.
+        Renames and excel travelers are then applied in a single phase, in filename order.
+        Files the folder manifest shows as already handled and unchanged are skipped, unless rescan is set.
+        With a summary_format ('xlsx' or 'csv') the travelers of the run are also written to a batch summary.
+        With an io_concurrency the folder is read and renamed by read_document_async instead.
+        With dry_run the renames are only planned, nothing in the folder is created, renamed or recorded.
+        A rename batch left unfinished by a crash in the folder is finished first, see recover_renames.
+        Returns the results of process_document and the list of (filename, new filename) renames. """
+    folder_path = Path(folder_path)
+    if io_concurrency:
+        import asyncio
+        return asyncio.run(read_document_async(folder_path, jobs, rescan, summary_format, io_concurrency, dry_run))
+    if not dry_run:
+        recover_renames(folder_path)
+
+    # The folder is scanned a single time, the same index is used for every rename afterwards.
+    index = FolderIndex(folder_path)
+    manifest = Manifest(folder_path)
+    pdf_files = [file for file in index.pdf_files() if rescan or not manifest.is_current(file, index.occupied)]
+    logging.info(f'Found {len(pdf_files)} new or changed PDF files to check.')
+
+    # Parse phase: CPU bound PyPDF2 text extraction, nothing in the folder is renamed or created yet.
+    if jobs == 1:
+        results = [process_document(file) for file in pdf_files]
+    else:
+        # Worker processes hand their metric records back along with every result, see call_with_metrics.
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs or None, initializer=init_worker,
+                                                    initargs=(metrics.enabled, extraction_cache.path)) as executor:
+            results = [merge_worker_result(result) for result in
+                       executor.map(functools.partial(call_with_metrics, process_document), pdf_files, chunksize=4)]
+
+    # Apply phase: renames are only planned here, then applied as one batch.
+    # The manifest already uses the new names, it is saved first so a finished or replayed batch matches it.
+    plan_folder(index, manifest, results, summary_format, dry_run)
+    renames = list(index.renames)
+    if not dry_run:
+        manifest.save()
+        index.apply_renames()
+    return results, renames
+
+
+async def read_document_async(folder_path, jobs=1, rescan=False, summary_format=None, concurrency=IO_CONCURRENCY,
+                              dry_run=False):
+    """ read_document for folders on network shares, where every file access is a round trip.
+        Files are checked against the manifest and read concurrently in threads, at most concurrency at once,
+        and parsed from the bytes in memory while the next files are read. With worker processes each worker
+        reads its files itself, concurrently with the others. The renames are also moved concurrently.
+        Parsing, renames and workbooks give the same result as read_document. """
+    import asyncio
+
+    if not dry_run:
+        await asyncio.to_thread(recover_renames, folder_path)
+    index = await asyncio.to_thread(FolderIndex, folder_path)
+    manifest = await asyncio.to_thread(Manifest, folder_path)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def is_new(file):
+        async with semaphore:
+            return rescan or not await asyncio.to_thread(manifest.is_current, file, index.occupied)
+
+    pdf_files = index.pdf_files()
+    pdf_files = [file for file, new in zip(pdf_files, await asyncio.gather(*map(is_new, pdf_files))) if new]
+    logging.info(f'Found {len(pdf_files)} new or changed PDF files to check.')
+
+    # A single parsing thread keeps the work in filename order like read_document, or a pool of worker processes.
+    if jobs == 1:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        parse = process_document
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs or None, initializer=init_worker,
+                                                          initargs=(metrics.enabled, extraction_cache.path))
+        parse = functools.partial(call_with_metrics, process_document)
+    loop = asyncio.get_running_loop()
+
+    async def read_and_parse(file):
+        # The semaphore is held until the file is parsed, so at most concurrency files are held in memory.
+        async with semaphore:
+            # Drawings are skipped by process_document without being opened, they are not read either.
+            # Worker processes open the file themselves rather than be sent a pickled copy of its content.
+            data = None
+            if jobs == 1 and FolderIndex.drawing_pattern.match(file.name) is None:
+                data = await asyncio.to_thread(file.read_bytes)
+            result = await loop.run_in_executor(executor, parse, file, data)
+            return result if jobs == 1 else merge_worker_result(result)
+
+    with executor:
+        results = await asyncio.gather(*map(read_and_parse, pdf_files))
+
+    plan_folder(index, manifest, results, summary_format, dry_run)
+    renames = list(index.renames)
+    if not dry_run:
+        await asyncio.to_thread(manifest.save)
+        await index.apply_renames_async(concurrency)
+    return results, renames
+
+
+def plan_folder(index, manifest, results, summary_format=None, dry_run=False):
+    """ Creates the excel travelers and batch summary from the results of process_document,
+        and plans every rename in the FolderIndex, recording them in the manifest.
+        With dry_run the renames are planned but nothing is created or recorded. """
+    # Renames and workbook writes happen here only, in the same order every run.
+    apply_results(results, index, create_workbooks=not dry_run)
+    if summary_format is not None and not dry_run:
+        summary_path = write_batch_summary(results, index.folder_path, summary_format)
+        if summary_path is not None:
+            print(f'Batch summary written to {summary_path.name}', file=sys.stderr)
+
+    # Drawings without a traveler or PO are renamed too.
+    rename_unlinked_drawings(index)
+    if not dry_run:
+        record_results(manifest, index, results)
+
+
+def record_results(manifest, index, results):
+    """ Records what was done, then moves the records along with the planned renames of the FolderIndex
+        so they use the final file names. Must run before the renames are applied.
+        Files that could not be parsed are left out, so they are tried again. """
+    for document_type, filename, value, sha256 in results:
+        if document_type == PARSE_ERROR:
+            continue
+        outputs = [f'CT {value["job_number"]}.xlsx'] if document_type == TRAVELER else []
+
+        # Drawings are never opened, not even to hash them, they are recorded by size and mtime only.
+        manifest.record(index.folder_path / filename, document_type, outputs, sha256,
+                        hashed=FolderIndex.drawing_pattern.match(filename) is None)
+    for orig_filename, new_file_name in index.renames:
+        manifest.rename(orig_filename, new_file_name)
+
+
+class InotifyWatcher:
+    """ Watches folders with Linux inotify, reporting files that are written, moved in, moved out or removed. """
+
+    IN_MODIFY = 0x2
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_CLOEXEC = 0o2000000
+
+    # Header of every inotify event: watch descriptor, mask, cookie and length of the name that follows.
+    event_header = struct.Struct('iIII')
+
+    def __init__(self, folder_paths):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or libc_name is None:
+            raise OSError('inotify is only available on Linux')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        mask = (self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_CREATE |
+                self.IN_DELETE)
+        self.folders = {}
+        for folder_path in folder_paths:
+            watch_descriptor = libc.inotify_add_watch(self.fd, os.fsencode(folder_path), mask)
+            if watch_descriptor < 0:
+                error = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(error, os.strerror(error), str(folder_path))
+            self.folders[watch_descriptor] = folder_path
+
+    def read_events(self, timeout):
+        """ Waits up to timeout seconds for events, returns a list of (folder path, filename, exists) tuples.
+            A filename of None means the kernel queue overflowed and the folder has to be listed again. """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        buffer = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(buffer):
+            watch_descriptor, mask, _, length = self.event_header.unpack_from(buffer, offset)
+            name = buffer[offset + self.event_header.size:offset + self.event_header.size + length].rstrip(b'\0')
+            offset += self.event_header.size + length
+            if mask & self.IN_Q_OVERFLOW:
+                events.extend((folder_path, None, True) for folder_path in self.folders.values())
+            elif watch_descriptor in self.folders and name:
+                exists = not mask & (self.IN_MOVED_FROM | self.IN_DELETE)
+                events.append((self.folders[watch_descriptor], os.fsdecode(name), exists))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """ Fallback for InotifyWatcher, lists the folders every WATCH_POLL_SECONDS and compares sizes and mtimes.
+        Only the listing is repeated, files are still processed once since unchanged ones never show up. """
+
+    def __init__(self, folder_paths):
+        self.snapshots = {folder_path: self.snapshot(folder_path) for folder_path in folder_paths}
+        self.next_poll = time.monotonic() + WATCH_POLL_SECONDS
+
+    @staticmethod
+    def snapshot(folder_path):
+        """ Size and mtime of every file in the folder, keyed by filename. """
+        signatures = {}
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    signatures[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def read_events(self, timeout):
+        """ Same as InotifyWatcher.read_events, the folders are only listed once the poll interval has passed. """
+        time.sleep(max(0.0, min(timeout, self.next_poll - time.monotonic())))
+        if time.monotonic() < self.next_poll:
+            return []
+        self.next_poll = time.monotonic() + WATCH_POLL_SECONDS
+
+        events = []
+        for folder_path, old_snapshot in self.snapshots.items():
+            new_snapshot = self.snapshot(folder_path)
+            events.extend((folder_path, filename, True) for filename, signature in new_snapshot.items()
+                          if old_snapshot.get(filename) != signature)
+            events.extend((folder_path, filename, False) for filename in old_snapshot.keys() - new_snapshot.keys())
+            self.snapshots[folder_path] = new_snapshot
+        return events
+
+    def close(self):
+        pass
+
+
+class WatchedFolder:
+    """ State the watch daemon keeps for one drop folder. The FolderIndex and Manifest are loaded a single time,
+        then kept up to date from watcher events so the folder is never scanned again. """
+
+    def __init__(self, folder_path):
+        self.folder_path = Path(folder_path)
+        self.index = FolderIndex(self.folder_path)
+        self.manifest = Manifest(self.folder_path)
+
+        # Held while the index, manifest or folder is changed, never while a PDF is parsed.
+        self.lock = threading.Lock()
+
+    def handle(self, filename, parse, exports):
+        """
+        Processes a single settled file the same way read_document would.
+        :filename: name of the file in the folder
+        :parse: function used to run process_document, possibly in a worker process
+        :exports: queue receiving (WatchedFolder, workbook path, pdf path) for every new excel traveler
+        :return: None
+        """
+        path = self.folder_path / filename
+        with self.lock:
+            if not path.is_file():
+                return
+
+            # Drawings are renamed as soon as they arrive, the name does not depend on the traveler or PO.
+            part_id = self.index.add(filename)
+            if part_id is not None:
+                rename_drawings(self.index, part_id)
+                self.commit([(None, filename, None, None)] if filename.endswith('.pdf') else [])
+                return
+
+            if not self.index.is_document(filename) or self.manifest.is_current(path, self.index.occupied):
+                return
+
+        # Parsed without holding the lock, so the workers parse several files at the same time.
+        result = parse(path)
+
+        with self.lock:
+            apply_results([result], self.index)
+            if result[0] == TRAVELER:
+                workbook_name = f'CT {result[2]["job_number"]}.xlsx'
+                self.index.add(workbook_name)
+                exports.put((self, self.folder_path / workbook_name,
+                             self.folder_path / workbook_name.replace('.xlsx', EXPORTED_PDF_SUFFIX)))
+            self.commit([result])
+
+    def commit(self, results):
+        """ Records the results, saves the manifest and applies the planned renames, like read_document. """
+        record_results(self.manifest, self.index, results)
+        self.manifest.save()
+        self.index.apply_renames()
+
+
+def watch_folders(folder_paths, jobs=1, backend=None, poll=False):
+    """
+    Daemon mode, processes every traveler, PO and drawing dropped in the folders as soon as it is written.
+    Files that arrived while the daemon was not running are caught up on first, the manifest skips the rest.
+    :folder_paths: paths of the drop folders to watch
+    :jobs: number of files parsed at the same time, in worker processes when it is not 1, 0 uses every CPU
+    :backend: name of the export backend in export_backends, defaults to default_export_backend()
+    :poll: list the folders every WATCH_POLL_SECONDS instead of using inotify
+    :return: None, runs until CTRL+C is pressed
+    """
+    # Excel and LibreOffice need absolute paths, and the watcher reports events by the same paths.
+    folder_paths = [Path(folder_path).resolve() for folder_path in folder_paths]
+    backend = backend or default_export_backend()
+
+    # The watcher is started before catching up, so files dropped in the meantime are not missed.
+    watcher = None
+    if not poll:
+        try:
+            watcher = InotifyWatcher(folder_paths)
+        except OSError as e:
+            logging.info(f'inotify is not available ({e}), polling the folders instead.')
+    if watcher is None:
+        watcher = PollingWatcher(folder_paths)
+
+    folders = {}
+    for folder_path in folder_paths:
+        read_document(folder_path, jobs=jobs)
+        excel_to_pdf(folder_path, backend=backend)
+        folders[folder_path] = WatchedFolder(folder_path)
+
+    if jobs == 1:
+        executor = None
+        parse = process_document
+        workers = 1
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs or None, initializer=init_worker,
+                                                          initargs=(metrics.enabled, extraction_cache.path))
+        workers = jobs or os.cpu_count()
+
+        def parse(path):
+            return merge_worker_result(executor.submit(call_with_metrics, process_document, path).result())
+
+    # Settled files wait in a bounded queue, the dispatcher stops reading events while the workers are behind.
+    work_queue = queue.Queue(maxsize=WATCH_QUEUE_SIZE)
+    exports = queue.Queue()
+    threads = [threading.Thread(target=watch_worker, args=(work_queue, parse, exports), daemon=True)
+               for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    # Files seen by the watcher that are possibly still being written, with their last size, mtime and change time.
+    pending = {}
+    print(f'Watching {len(folders)} folder(s). Press CTRL+C or close the window to exit.')
+    try:
+        while True:
+            for folder_path, filename, exists in watcher.read_events(WATCH_SETTLE_SECONDS / 4 if pending else 1.0):
+                folder = folders[folder_path]
+                if filename is None:
+                    # Events were lost, every file is checked again and the manifest skips those already handled.
+                    for lost_filename in PollingWatcher.snapshot(folder_path):
+                        pending[(folder, lost_filename)] = (None, time.monotonic())
+                elif filename.startswith('.'):
+                    continue
+                elif exists:
+                    pending[(folder, filename)] = (file_signature(folder_path / filename), time.monotonic())
+                else:
+                    pending.pop((folder, filename), None)
+                    with folder.lock:
+                        folder.index.discard(filename)
 
+            for folder, filename in settled_files(pending):
+                work_queue.put((folder, filename))
 
-def purchase_order_process(filename):
-    """ Opens purchase order with PyPDF and sorts information into variables.
-        Passes appropriate variables into rename_drawings and rename_traveler. """
-    logging.info(f'Processing the following Xometry PO: {filename}')
+            # Exports run on this thread only, COM objects such as Excel may not be shared between threads.
+            export_pending(exports, backend)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for _ in threads:
+            work_queue.put(None)
+        for thread in threads:
+            thread.join()
+        export_pending(exports, backend)
+        if executor is not None:
+            executor.shutdown()
+        watcher.close()
+        if metrics.enabled:
+            metrics.flush()
+            print(metrics.summary())
+
+
+def watch_worker(work_queue, parse, exports):
+    """ Daemon worker thread, handles settled files from the work queue until it receives None. """
+    while True:
+        item = work_queue.get()
+        if item is None:
+            return
+        folder, filename = item
+        try:
+            folder.handle(filename, parse, exports)
+        except Exception as e:
+            print(f'Failed to process {filename}, it is tried again when it changes.')
+            print(str(e))
+        metrics.flush()
+
+
+def file_signature(path):
+    """ Size and mtime of a file, None if it does not exist any more. """
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def settled_files(pending):
+    """ Removes and returns the pending files whose size and mtime did not change for WATCH_SETTLE_SECONDS.
+        PDFs must also end with the %%EOF marker, so a copy that stalled halfway is not parsed until it changes. """
+    now = time.monotonic()
+    settled = []
+    for key, (signature, since) in list(pending.items()):
+        if now - since < WATCH_SETTLE_SECONDS:
+            continue
+        folder, filename = key
+        path = folder.folder_path / filename
+        current_signature = file_signature(path)
+        if current_signature is None:
+            del pending[key]
+        elif current_signature != signature:
+            pending[key] = (current_signature, now)
+        else:
+            del pending[key]
+            if filename.lower().endswith('.pdf') and not pdf_complete(path):
+                logging.info(f'{filename} is not a complete PDF yet, waiting for it to change.')
+                continue
+            settled.append(key)
+    return settled
+
+
+def pdf_complete(path):
+    """ True if the end of file marker is in the last kilobyte of the PDF. """
+    try:
+        with open(path, 'rb') as pdf_file_obj:
+            pdf_file_obj.seek(0, os.SEEK_END)
+            pdf_file_obj.seek(max(0, pdf_file_obj.tell() - 1024))
+            return b'%%EOF' in pdf_file_obj.read()
+    except OSError:
+        return False
+
+
+def export_pending(exports, backend):
+    """ Exports every workbook waiting in the exports queue, one backend call per folder. """
+    conversions = {}
+    while not exports.empty():
+        folder, workbook_path, output_path = exports.get()
+        conversions.setdefault(folder, []).append((workbook_path, output_path))
+
+    for folder, folder_conversions in conversions.items():
+        try:
+            export_backends[backend](folder_conversions)
+        except Exception as e:
+            print(f'Failed to export the excel travelers in {folder.folder_path}.')
+            print(str(e))
+        with folder.lock:
+            record_exports(folder.manifest, folder_conversions)
+            for _, output_path in folder_conversions:
+                if output_path.is_file():
+                    folder.index.add(output_path.name)
+            folder.manifest.save()
+
+
+def unescape_literal(match):
+    """ Replaces a single escape sequence of a PDF literal string, unknown escapes keep only the character. """
+    escape = match.group(1)
+    if escape in literal_escapes:
+        return literal_escapes[escape]
+    if not escape.strip(b'01234567'):
+        return bytes([int(escape, 8) & 0xFF])
+    return escape
+
+
+def content_stream_text(content):
+    """ Extracts the text of raw content stream bytes the way PyPDF2's extractText does, without building objects.
+        Strings are kept as operands until the text showing operator (Tj, TJ, ' or ") that consumes them. """
+    import PyPDF2
+
+    text = ''
+    operands = []
+    for match in content_token_pattern.finditer(content):
+        literal, hexadecimal, operator = match.groups()
+        if literal is not None:
+            operands.append(literal_escape_pattern.sub(unescape_literal, literal[1:-1]))
+        elif hexadecimal is not None:
+            digits = hex_whitespace_pattern.sub(b'', hexadecimal)
+            operands.append(bytes.fromhex((digits + b'0' * (len(digits) % 2)).decode('ascii')))
+        elif operator in (b'true', b'false', b'null'):
+            continue
+        else:
+            # Only strings PyPDF2 decodes to text are extracted, byte strings are skipped like extractText does.
+            strings = [string for string in map(PyPDF2.generic.createStringObject, operands)
+                       if isinstance(string, PyPDF2.generic.TextStringObject)]
+            if operator == b'Tj' and strings:
+                text += strings[0] if len(operands) == 1 else ''
+            elif operator == b'T*':
+                text += '\n'
+            elif operator == b"'":
+                text += '\n' + (strings[0] if len(operands) == 1 and strings else '')
+            elif operator == b'"':
+                text += '\n' + (strings[-1] if len(operands) == 1 and strings else '')
+            elif operator == b'TJ':
+                text += ''.join(strings) + '\n'
+            operands = []
+    return text
+
+
+def classify_text(text):
+    """ Returns the document type of the first page text, or None if it is not an Xometry document. """
+    # Purchase orders carry 'PURCHASE ORDER' followed somewhere by Xometry's 7951 ZIP code.
+    po_start = text.find('PURCHASE ORDER')
+    if po_start != -1 and text.find('7951', po_start + len('PURCHASE ORDER')) != -1:
+        return PURCHASE_ORDER
+
+    # Travelers run the 'Purchase Order' and 'Due' headers together.
+    if 'Purchase OrderDue' in text:
+        return TRAVELER
+    return None
+
+
+@timed('classify_document')
+def classify_document(document):
+    """ Determines the document type from a bounded prefix of the first page content stream.
+        Full text extraction of the first page is only used when the prefix is cut short before any marker is found.
+        The raw prefix can not rule a document out: a logo or inline image may fill it, or the header may be drawn
+        with hex strings, and a wrong None would be recorded in the manifest and extraction cache. """
+    content, truncated = document.page0_content_prefix(CLASSIFY_PREFIX_BYTES)
+    document_type = classify_text(content_stream_text(content))
+    if document_type is not None or not truncated:
+        return document_type
+
+    # Markers may continue past the prefix. Drawings are already skipped by name, so this is rare.
+    logging.debug(f'{document.filename} classification prefix cut short, extracting page 1.')
+    return classify_text(document.page_text(0))
+
+
+@timed('process_document')
+def process_document(file, data=None):
+    """ Classifies and parses a single PDF given as a Path, from its content in data when it was already read.
+        Safe to run in a worker process or thread since it does not rename anything.
+        A file that can not be read or parsed gives a PARSE_ERROR result with the error message instead of raising,
+        so the rest of the folder is still renamed and recorded. It is not recorded, the next run tries it again.
+        Returns a tuple of (document type, filename, traveler dictionary or PO job number, content hash). """
+    try:
+        return parse_file(file, data)
+    except Exception as e:
+        logging.warning(f'Failed to process {file.name}, it is tried again on the next run. {e}')
+        return PARSE_ERROR, file.name, str(e), None
 
-    # Regex pattern to grab Part ID (also used as Job Number) from purchase orders.
-    part_id_pattern = re.compile(r'(Qty\.)(\n)(.*?)(\w{7})(\n)', re.DOTALL)
 
-    # Open traveler with PyPDF2, this time reading everything since we know it's the document we are looking for.
-    parse_string = open_parse_pdf(filename)
+def parse_file(file, data=None):
+    """ process_document without the error handling, raises if the file can not be read or parsed. """
+    # Customer drawings are never Xometry documents, they are skipped without opening them.
+    if FolderIndex.drawing_pattern.match(file.name) is not None:
+        logging.info(f'{file.name} is a drawing, skipping.')
+        return None, file.name, None, None
 
-    # Create match group for job_number, then call rename_drawings
-    job_number_match = part_id_pattern.search(parse_string)
-    job_number = job_number_match.group(4)
-    rename_drawings(job_number)
+    # Opens file with PyPDF2 and checks the first page content stream to determine document type.
+    # The same document is then handed to the processing functions so it is never parsed twice.
+    logging.info(f'{file.name} is a PDF, opening contents to check document type.')
+    with PdfDocument(file, data) as document:
+        file = document.filename
 
+        # The same content was extracted before, possibly under another filename.
+        cached = extraction_cache.get(document.sha256)
+        if cached is not None:
+            logging.info(f'{file} found in the extraction cache.')
+            return cached[0], file, cached[1], document.sha256
 
-def rename_drawings(job_number):
-    """ Renames files to remove long string using the given Job Number from the Customer Traveler """
-    logging.info(f'Renaming drawings for the following Job Number: {job_number}')
+        document_type = classify_document(document)
+        value = None
 
-    # Pattern that looks for files with the provided Job_Number, drawing, and drawing filetype.
-    drawing_pattern = re.compile(rf'({job_number}_r_drawing_d_)(.*)(r_\w).*(\.pdf|\.jpg|\.jpeg|\.PDF|\.JPG|\.JPEG)')
+        if document_type == PURCHASE_ORDER:
+            logging.info(f'{file} is an Xometry Purchase Order')
+            value = purchase_order_process(document)
 
-    # Searches through all files in the current working directory (directory provided).
-    for orig_filename in os.listdir('.'):
+        elif document_type == TRAVELER:
+            logging.info(f'{file} is an Xometry Traveler')
+            value = traveler_process(document)
 
-        # If pattern matches filename, process the filename into regex match groups.
-        matches = drawing_pattern.search(orig_filename)
-        if matches is None:
-            continue
-        prefix = matches.group(1)
-        long_alphanum = matches.group(2)
-        suffix = matches.group(3)
-        extension = matches.group(4)
+        extraction_cache.put(document.sha256, document_type, value)
+        return document_type, file, value, document.sha256
 
-        # If orig_filename does not have the long alphanumeric, it means file has already been renamed, skips.
-        if long_alphanum == '':
-            logging.info(f'{orig_filename} already renamed. Skipping.')
-            continue
 
-        # Loop through valid files, creating a file name with customer provided format.
-        counter = 1
-        new_file_name = prefix + suffix + ' (' + str(counter) + ')' + extension
+def apply_results(results, index, create_workbooks=True):
+    """ Plans the drawing and traveler renames in the FolderIndex and creates the excel travelers
+        from the results of process_document, unless create_workbooks is False.
+        Results are handled WORKBOOK_CHUNK_SIZE at a time, so the PNGs held in memory do not grow with the folder. """
+    for chunk_start in range(0, len(results), WORKBOOK_CHUNK_SIZE):
+        apply_results_chunk(results[chunk_start:chunk_start + WORKBOOK_CHUNK_SIZE], index, create_workbooks)
 
-        # If file name already exists, appends an incrementing number just before file extension.
-        while os.path.isfile(new_file_name):
-            counter += 1
-            new_file_name = prefix + suffix + ' (' + str(counter) + ')' + extension
 
-        # After creating the filenames, move the files.
-        logging.info(f'Renaming "{orig_filename}" TO "{new_file_name}"')
-        shutil.move(orig_filename, new_file_name)
+def apply_results_chunk(results, index, create_workbooks):
+    """ apply_results for a single chunk of results. """
+    # The preview images of the chunk's travelers are prepared as a batch before their workbooks are created.
+    images = [value['image'] for document_type, _, value, _ in results
+              if create_workbooks and document_type == TRAVELER and value['image'] is not None]
+    previews = iter(prepare_previews(images))
 
+    for document_type, filename, value, _ in results:
+        if document_type == PURCHASE_ORDER:
+            rename_drawings(index, value)
 
-def rename_unlinked_drawings(abs_folder_path):
-    """ Renames files to remove long strings from drawing titles unrelated to Travelers/POs. """
+        elif document_type == TRAVELER:
+            job_number = value['job_number']
 
-    logging.info(f'Renaming unlinked drawings in the following folder: {abs_folder_path}')
-    os.chdir(abs_folder_path)
+            # Rename drawings after we have the provided Job Number.
+            logging.info(f'Sending {job_number} to "rename_drawings"')
+            rename_drawings(index, job_number)
 
-    # Pattern that looks for files with the provided Job_Number, drawing, and drawing filetype.
-    drawing_pattern = re.compile(rf'(.*)(_r_drawing_d_)(.*)(r_\w).*(\.pdf|\.jpg|\.jpeg|\.PDF|\.JPG|\.JPEG)')
+            # Rename travelers after we have the provided Job Number and Traveler filename.
+            logging.info(f'Sending {filename} and {job_number} to "rename_traveler"')
+            rename_traveler(index, filename, job_number)
 
-    # Searches through all files in the current working directory (directory provided).
-    for orig_filename in os.listdir('.'):
+            if create_workbooks:
+                logging.info(f'traveler_dictionary contains the following: \n{value}')
+                logging.info(f'Sending traveler information to create_excel.')
+                create_excel(value, index.folder_path, None if value['image'] is None else next(previews))
 
-        # If pattern matches filename, process the filename into regex match groups.
-        matches = drawing_pattern.search(orig_filename)
-        if matches is None:
-            continue
-        part_id = matches.group(1)
-        prefix = matches.group(2)
-        long_alphanum = matches.group(3)
-        suffix = matches.group(4)
-        extension = matches.group(5)
 
-        # If orig_filename does not have the long alphanumeric, it means file has already been renamed, skips.
-        if long_alphanum == '':
-            logging.info(f'{orig_filename} already renamed. Skipping.')
-            continue
+@timed('traveler_process')
+def traveler_process(document):
+    """ Sorts the information of an opened traveler PdfDocument into variables.
+        Returns the traveler dictionary used for renames and the excel traveler. """
+    logging.info(f'Processing the following Xometry Traveler: {document.filename}')
 
-        # Loop through valid files, creating a file name with customer provided format.
-        counter = 1
-        new_file_name = part_id + prefix + suffix + ' (' + str(counter) + ')' + extension
+    # Read every page of the traveler, the notes run until the end of the document.
+    parse_string = open_parse_pdf(document)
 
-        # If file name already exists, appends an incrementing number just before file extension.
-        while os.path.isfile(new_file_name):
-            counter += 1
-            new_file_name = part_id + prefix + suffix + ' (' + str(counter) + ')' + extension
+    # Slice traveler information into fields between the section labels.
+    (po_number, due_date, contact, job_number, part_name, extension, quantity,
+     finish, material, certifications, inspection, notes) = extract_traveler_fields(parse_string)
+
+    # Create dictionary and sort fields into keys for passing into traveler creation.
+    traveler_dictionary = {}
 
-        # After creating the filenames, move the files.
-        logging.info(f'Renaming "{orig_filename}" TO "{new_file_name}"')
-        shutil.move(orig_filename, new_file_name)
+    logging.debug(f'PO Number is: {po_number}')
+    traveler_dictionary['po_number'] = po_number
 
+    logging.debug(f'Due Date is: {due_date}')
+    traveler_dictionary['due_date'] = due_date
 
-def rename_traveler(original_traveler, job_number):
-    """ Renames Customer Traveler files to match the following format: CT (Job Number).pdf """
+    logging.debug(f'Contact is: {contact}')
+    traveler_dictionary['contact'] = contact
+
+    # Passes job number into rename_drawings and rename_traveler
+    logging.debug(f'Job Number is: {job_number}')
+    traveler_dictionary['job_number'] = job_number
+
+    # Grabs the preview image from the pdf, kept in memory for the excel traveler.
+    traveler_dictionary['image'] = image_grab(document)
+
+    logging.debug(f'Part File is: {part_name + extension}')
+    traveler_dictionary['part_file'] = remove_newlines(part_name + extension)
+
+    logging.debug(f'Quantity is: {quantity}')
+    traveler_dictionary['quantity'] = quantity
+
+    logging.debug(f'Finish is: {finish}')
+    traveler_dictionary['finish'] = finish
+
+    logging.debug(f'Material is: {material}')
+    traveler_dictionary['material'] = material
 
-    # Pattern that looks for optional 'CT ' followed by any "filename.pdf or .PDF" format.
-    traveler_pattern = re.compile(r'(CT )?(.*)(\.pdf|\.PDF)')
+    logging.debug(f'Certifications required are: {certifications}')
+    # Certificates are capitalised after low_up, so its spacing is the same as for the text Xometry wrote.
+    traveler_dictionary['certifications'] = low_up(remove_newlines(certifications)).replace('certific', 'Certific')
 
-    # Loops over all files in current working directory.
-    for orig_filename in os.listdir('.'):
-        matches = traveler_pattern.search(orig_filename)
+    logging.debug(f'Inspection requirements are: {inspection}')
+    traveler_dictionary['inspection'] = low_up(remove_newlines(inspection))
 
-        # If pattern for file does not match, skips.
+    logging.debug(f'Notes are: {notes}')
+    traveler_dictionary['notes'] = notes
+
+    return traveler_dictionary
+
+
+def extract_traveler_fields(parse_string):
+    """
+    Slices the text of a traveler into its fields by locating the section labels, probably the part that will
+    need editing the most to fit all traveler patterns. Every label is searched for once, moving forward only,
+    so runtime stays linear even when a traveler does not match (unlike one big regex of lazy groups).
+    :parse_string: text of every page of the traveler
+    :return: tuple of PO number, due date, contact, part ID, part name, extension, quantity, finish,
+             material, certifications, inspection requirements and notes
+    """
+    def find(label, pos):
+        index = parse_string.find(label, pos)
+        if index == -1:
+            raise ValueError(f'Traveler does not match the expected layout, "{label}" not found.')
+        return index
+
+    def search(pattern, pos, label):
+        matches = pattern.search(parse_string, pos)
         if matches is None:
-            continue
+            raise ValueError(f'Traveler does not match the expected layout, {label} not found.')
+        return matches
+
+    # DateContact, then PO Number and Due Date.
+    header = search(traveler_header_pattern, 0, 'PO number and due date')
+    po_number, due_date = header.group(1), header.group(2)
+
+    # Contact runs up to the first '.com' after the first '@'.
+    contact_end = find('.com', find('@', header.end()) + 1) + 4
+    contact = parse_string[header.end():contact_end]
+
+    # Quantity, then Part ID and Part name up to the first part file extension.
+    part = search(traveler_part_pattern, contact_end, 'Part ID')
+    job_number = part.group(1)
+    extension = search(traveler_extension_pattern, part.end(), 'part file extension')
+    part_name = parse_string[part.end():extension.start()]
+
+    # Quantity is the first number after the part file.
+    quantity = search(traveler_quantity_pattern, extension.end(), 'quantity')
+
+    # 'tions' (end of Certifications label), then Finish up to the first lowercase letter followed by
+    # an uppercase letter or digit, which starts the Material.
+    finish_start = find('tions', quantity.end()) + 5
+    material_start = search(traveler_finish_end_pattern, finish_start, 'finish').start() + 1
+    finish = parse_string[finish_start:material_start]
+
+    # Material runs until the Certifications, which start with '\n-' or 'Cert'.
+    material_min_end = material_start + (2 if parse_string.startswith('\n', material_start) else 1)
+    certifications_start = search(traveler_certifications_pattern, material_min_end, 'certifications').start()
+    material = parse_string[material_start:certifications_start]
+
+    # Certifications run until 'Inspection', without the newline right before it.
+    certifications_min_end = certifications_start + (2 if parse_string[certifications_start] == '\n' else 4)
+    inspection_label = find('Inspection', certifications_min_end)
+    certifications_end = inspection_label
+    if inspection_label - 1 >= certifications_min_end and parse_string[inspection_label - 1] == '\n':
+        certifications_end = inspection_label - 1
+    certifications = parse_string[certifications_start:certifications_end]
+
+    # Inspection Requirements start after the first lowercase letter followed by an uppercase letter.
+    inspection_start = search(traveler_inspection_pattern, inspection_label + 10, 'inspection requirements').end()
+    notes_start = find('Features:', inspection_start + 1)
+    inspection = parse_string[inspection_start:notes_start]
+
+    # Notes are everything from 'Features:' onwards.
+    notes = parse_string[notes_start:]
+
+    return (po_number, due_date, contact, job_number, part_name, extension.group(0), quantity.group(0),
+            finish, material, certifications, inspection, notes)
+
+
+@timed('purchase_order_process')
+def purchase_order_process(document):
+    """ Sorts the information of an opened purchase order PdfDocument into variables.
+        Returns the job number used to rename the drawings. """
+    logging.info(f'Processing the following Xometry PO: {document.filename}')
+
+    # Read pages only until the Part ID is found, the terms and conditions pages after it are never extracted.
+    # Create match group for job_number, drawings are renamed with it later.
+    job_number_match = search_pdf(document, po_part_id_pattern, PO_PART_ID_MAX_SPAN)
+    if job_number_match is None:
+        raise ValueError('Purchase order does not match the expected layout, part ID not found.')
+    return job_number_match.group(4)
+
+
+@timed('rename_drawings')
+def rename_drawings(index, job_number):
+    """ Renames files to remove long string using the given Job Number from the Customer Traveler """
+    logging.info(f'Renaming drawings for the following Job Number: {job_number}')
 
-        # If match group 1 (for 'CT ') is not empty, file has already been processed, leave function.
-        if matches.group(1) is not None:
-            logging.info(f'{orig_filename} has already been renamed. Skipping.')
-            break
+    # The folder index already holds every drawing with the provided Job_Number that still needs renaming.
+    for matches in index.drawings.pop(job_number, []):
+        prefix = matches.group(1) + matches.group(2)
+        suffix = matches.group(4)
+        extension = matches.group(5)
 
-        prefix = matches.group(2)
-        extension = matches.group(3)
+        # Creating a file name with customer provided format, numbered so it does not replace another file.
+        new_file_name = index.free_drawing_name(prefix + suffix, extension)
+        index.rename(matches.group(0), new_file_name)
 
-        # If file name being passed in matches the name search exactly, we are working with the right file.
-        if original_traveler == prefix + extension:
 
-            # Create the new file name.
-            new_file_name = 'CT ' + job_number + extension
+@timed('rename_unlinked_drawings')
+def rename_unlinked_drawings(index):
+    """ Renames files to remove long strings from drawing titles unrelated to Travelers/POs. """
 
-            # Rename the file.
-            logging.info(f'Renaming "{original_traveler}" TO "{new_file_name}"')
-            shutil.move(original_traveler, new_file_name)
+    logging.info(f'Renaming unlinked drawings in the following folder: {index.folder_path}')
 
+    # Every drawing left in the folder index was not claimed by a traveler or PO.
+    for part_id in sorted(index.drawings):
+        rename_drawings(index, part_id)
 
-def create_excel(traveler_dictionary, folder_path):
+
+@timed('rename_traveler')
+def rename_traveler(index, original_traveler, job_number):
+    """ Renames Customer Traveler files to match the following format: CT (Job Number).pdf """
+
+    matches = traveler_filename_pattern.search(original_traveler)
+
+    # If pattern for file does not match, or the file is not in the folder any more, skips.
+    if matches is None or original_traveler not in index.occupied:
+        return
+
+    # If match group 1 (for 'CT ') is not empty, file has already been processed.
+    if matches.group(1) is not None:
+        logging.info(f'{original_traveler} has already been renamed. Skipping.')
+        return
+
+    # Create the new file name, then plan the rename.
+    new_file_name = 'CT ' + job_number + matches.group(3)
+    index.rename(original_traveler, new_file_name)
+
+
+class DueDateRules:
+    """ Due date rules compiled once into a single pattern per traveler field, every keyword of every rule is an
+        alternative of it so each field is scanned once. The adjusted date is then computed in one step with
+        numpy business day arithmetic, for a single traveler or thousands of them at a time. """
+
+    def __init__(self, rules=DUE_DATE_RULES, default_days=DUE_DATE_DEFAULT_DAYS, holidays=DUE_DATE_HOLIDAYS):
+        self.rules = rules
+        self.default_days = default_days
+        self.holidays = list(holidays)
+        self._calendar = None
+
+        # Rules are tried at every position in order of precedence, the lookahead keeps one keyword
+        # from hiding another that overlaps it.
+        alternatives = {}
+        for number, (fields, keywords, whole_field, _) in enumerate(rules):
+            keyword_pattern = '|'.join(re.escape(keyword) for keyword in keywords)
+            if whole_field:
+                keyword_pattern = rf'\A(?:{keyword_pattern})\Z'
+            for field in fields:
+                alternatives.setdefault(field, []).append(f'(?P<rule{number}>{keyword_pattern})')
+        self.patterns = {field: re.compile(f'(?=(?:{"|".join(groups)}))') for field, groups in alternatives.items()}
+
+    def business_days(self, traveler_dictionary):
+        """ Number of business days the due date of a traveler moves up by. """
+        first_rule = len(self.rules)
+        for field, pattern in self.patterns.items():
+            for matches in pattern.finditer(traveler_dictionary[field]):
+                first_rule = min(first_rule, int(matches.lastgroup[4:]))
+                if first_rule == 0:
+                    return self.rules[0][3]
+        return self.rules[first_rule][3] if first_rule < len(self.rules) else self.default_days
+
+    @property
+    def calendar(self):
+        """ numpy business day calendar skipping weekends and the holidays, made on first use. """
+        if self._calendar is None:
+            import numpy as np
+            self._calendar = np.busdaycalendar(holidays=self.holidays)
+        return self._calendar
+
+    def due_date(self, traveler_dictionary, today=None):
+        """ Adjusted due date of a traveler as MM/DD/YYYY text, or 'ASAP' if it is before today. """
+        return self.due_dates([traveler_dictionary], today)[0]
+
+    def due_dates(self, traveler_dictionaries, today=None):
+        """
+        Adjusted due dates of many travelers at once, for what-if runs of the rules over old travelers.
+        :traveler_dictionaries: traveler dictionaries from traveler_process, or with at least the due date and fields
+        :today: date compared against for 'ASAP', defaults to the current date
+        :return: list of MM/DD/YYYY texts or 'ASAP', in the same order
+        """
+        import numpy as np
+
+        adjusted = self.adjusted_dates(traveler_dictionaries)
+        today = np.datetime64(today or datetime.today().date(), 'D')
+        return ['ASAP' if date < today else f'{text[5:7]}/{text[8:10]}/{text[0:4]}'
+                for date, text in zip(adjusted, np.datetime_as_string(adjusted))]
+
+    def adjusted_dates(self, traveler_dictionaries):
+        """ Adjusted due dates of many travelers as a numpy datetime64 array, before they are compared to today. """
+        import numpy as np
+
+        # MM/DD/YYYY to ISO so numpy parses every date in one call.
+        due_dates = np.array([f'{date[6:10]}-{date[0:2]}-{date[3:5]}' for date in
+                              (traveler_dictionary['due_date'] for traveler_dictionary in traveler_dictionaries)],
+                             dtype='datetime64[D]')
+        days = np.array([self.business_days(traveler_dictionary) for traveler_dictionary in traveler_dictionaries],
+                        dtype=np.int64)
+
+        # A due date on a weekend or holiday counts from the next business day.
+        return np.busday_offset(due_dates, -days, roll='forward', busdaycal=self.calendar)
+
+
+# Default due date rules used by create_excel.
+due_date_rules = DueDateRules()
+
+
+class BatchSummary:
+    """ One consolidated workbook or CSV file with a row for every traveler of a run, for planning the day's work.
+        Rows are streamed to the file as they are added, through a write-only workbook or a CSV writer,
+        so memory stays the same however many travelers there are. """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.rows = 0
+        if self.path.suffix == '.csv':
+            # The byte order mark makes Excel open the file as UTF-8.
+            self.file = open(self.path, 'w', newline='', encoding='utf-8-sig')
+            self.writer = csv.writer(self.file)
+            self.workbook = None
+        else:
+            import openpyxl
+            self.workbook = openpyxl.Workbook(write_only=True)
+            self.sheet = self.workbook.create_sheet('Travelers')
+            self.sheet.freeze_panes = 'A2'
+        self.write_row([column for column, _ in SUMMARY_COLUMNS])
+
+    def write_row(self, values):
+        if self.workbook is None:
+            self.writer.writerow(values)
+        else:
+            self.sheet.append(values)
+
+    def add_travelers(self, traveler_dictionaries, today=None):
+        """ Writes a row for each traveler dictionary, due dates are adjusted for all of them in one step. """
+        today = today or datetime.today().date()
+        adjusted_dates = due_date_rules.adjusted_dates(traveler_dictionaries).astype(object)
+        for traveler_dictionary, adjusted_date in zip(traveler_dictionaries, adjusted_dates):
+            row = dict(traveler_dictionary, adjusted_due_date=adjusted_date, asap=adjusted_date < today,
+                       workbook=f'CT {traveler_dictionary["job_number"]}.xlsx')
+            self.write_row([summary_cell(row[key], self.workbook is not None) for _, key in SUMMARY_COLUMNS])
+            self.rows += 1
+
+    def close(self):
+        if self.workbook is None:
+            self.file.close()
+            return
+        from openpyxl.utils import get_column_letter
+        self.sheet.auto_filter.ref = f'A1:{get_column_letter(len(SUMMARY_COLUMNS))}{self.rows + 1}'
+        self.workbook.save(self.path)
+
+
+def summary_cell(value, workbook):
+    """ Value of a batch summary cell: dates stay dates in the workbook and are ISO text in the CSV,
+        the ASAP flag is Yes or No, quantities are numbers and text fields lose their line breaks. """
+    if isinstance(value, bool):
+        return 'Yes' if value else 'No'
+    if hasattr(value, 'isoformat'):
+        return value if workbook else value.isoformat()
+    value = remove_newlines(value).strip()
+    return int(value) if value.isdigit() else value
+
+
+@timed('write_batch_summary')
+def write_batch_summary(results, folder_path, summary_format):
+    """
+    Writes the batch summary of the travelers in the results of process_document.
+    :results: list of process_document results of a run
+    :folder_path: folder the summary is saved in
+    :summary_format: 'xlsx' or 'csv'
+    :return: path of the summary, or None when the run had no travelers
+    """
+    travelers = (value for document_type, _, value, _ in results if document_type == TRAVELER)
+    summary = None
+    while True:
+        # Due dates are adjusted a chunk at a time, so only one chunk of rows is ever prepared at once.
+        chunk = list(itertools.islice(travelers, SUMMARY_CHUNK_SIZE))
+        if not chunk:
+            break
+        if summary is None:
+            summary = BatchSummary(Path(folder_path) / f'{SUMMARY_PREFIX} {datetime.now():%Y-%m-%d %H%M%S}.'
+                                                         f'{summary_format}')
+        summary.add_travelers(chunk)
+    if summary is None:
+        return None
+    summary.close()
+    return summary.path
+
+
+@timed('create_excel')
+def create_excel(traveler_dictionary, folder_path, preview=None):
     """
     Creates an excel template that mimics the customer traveler so that we can pass in information from the PDF.
     :traveler_dictionary: dictionary with information from traveler sorted by category.
     :folder_path: path to the directory directly containing the traveler
+    :preview: PNG of the preview image from prepare_previews, prepared here when not given
     :return: None
     """
-    # Gets the directory of the executable script, which contains the template we will open.
-    script_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
-    os.chdir(script_path)
-    wb = openpyxl.load_workbook(resource_path('templates/TravelerTemplate.xlsx'))
+    import openpyxl.drawing.image
+    from openpyxl.drawing.spreadsheet_drawing import AbsoluteAnchor
+    from openpyxl.drawing.xdr import XDRPoint2D, XDRPositiveSize2D
+    from openpyxl.utils.units import pixels_to_EMU
+
+    folder_path = Path(folder_path)
+
+    # Fresh in-memory copy of the template, it is only read from disk once per process.
+    wb = load_template()
 
     # Transfer the traveler dictionary values into the excel template.
     sheet = wb['Sheet1']
@@ -314,190 +1915,583 @@ def create_excel(traveler_dictionary, folder_path):
     sheet['A12'] = traveler_dictionary['inspection'].strip('\n')
 
     # Replace all of Xometry mentions with 'CUSTOMER'
-    no_customer = re.sub(r'xometry|Xometry|XOMETRY', 'CUSTOMER', traveler_dictionary['notes'].strip('\n'))
-    no_trademark = replace_trademark(no_customer)
-    no_fluid = replace_fluid(no_trademark)
-    final_notes = process_notes(no_fluid)
+    no_customer = customer_name_pattern.sub('CUSTOMER', traveler_dictionary['notes'].strip('\n'))
+    final_notes = process_notes(no_customer)
     sheet['A14'] = final_notes
 
-    # Date modifications according to customer instructions
-    date = traveler_dictionary['due_date']
-    date_time_obj = datetime.strptime(date, "%m/%d/%Y")
-
-    # 1) If “Finish” block says “Standard”, change due date to two business days before current due date.
-    if traveler_dictionary['finish'] == 'Standard':
-        sheet['B6'] = f'{date_time_obj.date() - timedelta(days=2):%m/%d/%Y}'
-
-    # 2) If anything in the pdf mentions “mask” or “masking”, “heat treat”, “heat treating”, “harden”,
-    # or “through harden” change due date to 7 business days before current due date
-    post_process_pattern = re.compile(r'(mask|masking|heat treat|heat treating|harden|through harden)')
-    matches = post_process_pattern.search(traveler_dictionary['finish'])
-    if matches is not None:
-        sheet['B6'] = f'{date_time_obj.date() - timedelta(days=7):%m/%d/%Y}'
-    matches = post_process_pattern.search(traveler_dictionary['material'])
-    if matches is not None:
-        sheet['B6'] = f'{date_time_obj.date() - timedelta(days=7):%m/%d/%Y}'
-    matches = post_process_pattern.search(traveler_dictionary['notes'])
-    if matches is not None:
-        sheet['B6'] = f'{date_time_obj.date() - timedelta(days=7):%m/%d/%Y}'
-
-    # 3) If “Finish” block says “Custom” but there’s no mention of masking in rest of pdf,
-    # change due date to 5 business days before current due date
-    finish_pattern = re.compile(r'custom|CUSTOM|Custom')
-    mask_pattern = re.compile(r'mask|MASK|masking|MASKING')
-    finish_matches = finish_pattern.search(traveler_dictionary['finish'])
-    if finish_matches is not None:
-        sheet['B6'] = f'{date_time_obj.date() - timedelta(days=5):%m/%d/%Y}'
-        mask_matches = mask_pattern.search(traveler_dictionary['finish'])
-        if mask_matches is not None:
-            sheet['B6'] = f'{date_time_obj.date() - timedelta(days=7):%m/%d/%Y}'
-        mask_matches = mask_pattern.search(traveler_dictionary['material'])
-        if mask_matches is not None:
-            sheet['B6'] = f'{date_time_obj.date() - timedelta(days=7):%m/%d/%Y}'
-        mask_matches = mask_pattern.search(traveler_dictionary['notes'])
-        if mask_matches is not None:
-            sheet['B6'] = f'{date_time_obj.date() - timedelta(days=7):%m/%d/%Y}'
-
-    # 4) If the pdf is absent of any of the phrases in a,b, or c and “Finish” block mentions any other kind of finish,
-    # change due date to three business days before current due date.
-    elif traveler_dictionary['finish'] is not None:
-        sheet['B6'] = f'{date_time_obj.date() - timedelta(days=3):%m/%d/%Y}'
-
-    # 5) If in following the rules, the resulting date is less than today’s date,
-    # replace the date with the text “ASAP”
-    compare_today = sheet['B6'].value
-    compare_time_obj = datetime.strptime(compare_today, "%m/%d/%Y")
-    if compare_time_obj.date() < datetime.today().date():
-        sheet['B6'] = 'ASAP'
-
-    # Change to folder path to grab image and save excel file.
-    os.chdir(folder_path)
-
-    # Opens image and converts to RGBA format
-    im = Image.open(f'{traveler_dictionary["job_number"]}.png')
-    im = im.convert('RGBA')
-
-    # Uses numpy to convert img background to white
-    data = np.array(im)  # "data" is a height x width x 4 numpy array
-    red, green, blue, alpha = data.T  # Temporarily unpack the bands for readability
-
-    # Replace black with white... (leaves alpha values alone...)
-    black_areas = (red == 0) & (blue == 0) & (green == 0)
-    data[..., :-1][black_areas.T] = (255, 255, 255)  # Transpose back needed
-
-    # Closes original image, than saves new image with white background
-    im2 = Image.fromarray(data)
-    im.close()
-    im2.save(f'{traveler_dictionary["job_number"]}.png')
-
-    # Opens image and resizes it to fit the template.
-    im = Image.open(f'{traveler_dictionary["job_number"]}.png')
-    resized_im = im.resize((round(im.size[0]*0.75), round(im.size[1]*0.75)))
-    resized_im.save(f'{traveler_dictionary["job_number"]}.png')
+    # Due date modifications according to customer instructions, see DUE_DATE_RULES.
+    sheet['B6'] = due_date_rules.due_date(traveler_dictionary)
 
     # Anchors the image in the template excel according to absolute values to horizontally align center.
-    img = openpyxl.drawing.image.Image(f'{traveler_dictionary["job_number"]}.png')
-    p2e = pixels_to_EMU
-    h, w = img.height, img.width
-    position = XDRPoint2D(p2e(210), p2e(80))
-    size = XDRPositiveSize2D(p2e(h), p2e(w))
-    img.anchor = AbsoluteAnchor(pos=position, ext=size)
-    sheet.add_image(img)
+    if traveler_dictionary['image'] is not None:
+        if preview is None:
+            preview = prepare_preview(traveler_dictionary['image'])
+        img = openpyxl.drawing.image.Image(preview)
+        p2e = pixels_to_EMU
+        h, w = img.height, img.width
+        position = XDRPoint2D(p2e(210), p2e(80))
+        size = XDRPositiveSize2D(p2e(h), p2e(w))
+        img.anchor = AbsoluteAnchor(pos=position, ext=size)
+        sheet.add_image(img)
+
+    # Print area and page setup travel with the workbook, so every export backend prints the same pages.
+    sheet.print_area = PRINT_AREA
+    sheet.sheet_properties.pageSetUpPr.fitToPage = True
+    sheet.page_setup.fitToWidth = 1
+    sheet.page_setup.fitToHeight = 2
 
     # Saves the template file as the new traveler name. Customer can now open and print as PDF.
-    wb.save(f'CT {traveler_dictionary["job_number"]}.xlsx')
+    wb.save(folder_path / f'CT {traveler_dictionary["job_number"]}.xlsx')
+
 
-    # Deletes the image file since we no longer need it.
-    os.remove(f'{traveler_dictionary["job_number"]}.png')
+def prepare_preview(image):
+    """
+    Converts the preview image background to white and resizes it to fit the template, all in memory.
+    :image: PIL image returned by image_grab
+    :return: BytesIO holding the finished PNG, ready for openpyxl
+    """
+    return prepare_previews([image])[0]
 
 
-def image_grab(pdf, job_number):
+@timed('prepare_previews')
+def prepare_previews(images):
+    """
+    prepare_preview for many previews at once. Previews of the same size are stacked into a single array so the
+    background replacement is one numpy operation for the whole batch, each preview is then resized by PIL.
+    :images: PIL images returned by image_grab
+    :return: list of BytesIO holding the finished PNGs, in the same order as images
+    """
+    import numpy as np
+    from PIL import Image
+
+    start = time.perf_counter()
+    pngs = [None] * len(images)
+    groups = {}
+    for position, image in enumerate(images):
+        groups.setdefault(image.size, []).append(position)
+
+    for (width, height), positions in groups.items():
+        # The pixel buffer is reused by every batch of the group.
+        new_size = (round(width * PREVIEW_SCALE), round(height * PREVIEW_SCALE))
+        batch_size = max(1, min(len(positions), PREVIEW_BATCH_BYTES // (height * width * 3)))
+        pixels = np.empty((batch_size, height, width, 3), dtype=np.uint8)
+
+        for batch_start in range(0, len(positions), batch_size):
+            batch = positions[batch_start:batch_start + batch_size]
+            count = len(batch)
+            for pixel, position in zip(pixels, batch):
+                pixel[...] = images[position].convert('RGB')
+
+            # Replace black with white.
+            batch_pixels = pixels[:count]
+            batch_pixels[(batch_pixels[..., 0] | batch_pixels[..., 1] | batch_pixels[..., 2]) == 0] = 255
+
+            # PIL's resize only visits the few source pixels under its filter, resize each image then encode once.
+            for position, preview in zip(batch, batch_pixels):
+                png = io.BytesIO()
+                Image.fromarray(preview).resize(new_size, Image.BICUBIC).save(png, format='PNG')
+                png.seek(0)
+                pngs[position] = png
+
+    seconds = time.perf_counter() - start
+    if images:
+        logging.info(f'Prepared {len(images)} previews in {seconds:.3f} s, {len(images) / seconds:.0f} images/sec.')
+    metrics.count('previews_prepared', len(images))
+    return pngs
+
+
+def load_template():
+    """ Returns a new copy of the traveler template workbook.
+        The template is bundled next to the script (or inside the pyinstaller executable). It is loaded and parsed
+        the first time only, after that each copy is unpickled from memory instead of re-reading the zip/XML. """
+    global _template_pickle
+    if _template_pickle is None:
+        import openpyxl
+        wb = openpyxl.load_workbook(resource_path('templates/TravelerTemplate.xlsx'))
+        _template_pickle = pickle.dumps(wb, protocol=pickle.HIGHEST_PROTOCOL)
+    return pickle.loads(_template_pickle)
+
+
+@timed('image_grab')
+def image_grab(document):
     """
     Grabs the preview image from the PDF for later processing into the template excel traveler.
-    :pdf: the filename of the traveler to grab image from
-    :job_number: the job number used to name the image file
-    :return: None
+    Sizes are read from the image dictionaries, only the largest image taller than PREVIEW_MIN_HEIGHT is decoded.
+    :document: the opened PdfDocument of the traveler to grab image from
+    :return: PIL image of the preview, or None if there is no preview
     """
+    # Only the first page has the preview image, the document already exposes its image XObjects.
+    images = document.page0_images()
+    if not images:
+        logging.warning(f'No image found in {document.filename}.')
+        return None
 
-    # Open the PDF, only parse the first page since that has the preview image.
-    pdf_obj = open(pdf, 'rb')
-    input1 = PyPDF2.PdfFileReader(pdf_obj)
-    page0 = input1.getPage(0)
+    # Filter for image sizes to avoid processing the customer logo image as well, before decompressing anything.
+    images = [image for image in images.values() if image['/Height'] > PREVIEW_MIN_HEIGHT]
+    if not images:
+        return None
+    image = max(images, key=lambda image: image['/Width'] * image['/Height'])
 
-    # Parse the PDF for iamge filetypes and saves them to the same directory.
-    if '/XObject' in page0['/Resources']:
-        xobject = page0['/Resources']['/XObject'].getObject()
+    preview = decode_image(image)
+    if preview is not None:
+        metrics.count('images_decoded', 1, document.filename)
+    return preview
 
-        for obj in xobject:
-            if xobject[obj]['/Subtype'] == '/Image':
-                size = (xobject[obj]['/Width'], xobject[obj]['/Height'])
-                data = xobject[obj].getData()
-                if xobject[obj]['/ColorSpace'] == '/DeviceRGB':
-                    mode = "RGB"
-                else:
-                    mode = "P"
-
-                # Filter for image sizes to avoid processing the customer logo image as well.
-                if '/Filter' in xobject[obj]:
-                    if xobject[obj]['/Filter'] == '/FlateDecode':
-                        img = Image.frombytes(mode, size, data)
-                        if img.height > 100:
-                            img.save(str(job_number) + ".png")
-                            # img.save(str(job_number) + ' ' + obj[1:] + ".png")
-                    elif xobject[obj]['/Filter'] == '/DCTDecode':
-                        img = open(obj[1:] + ".jpg", "wb")
-                        img.write(data)
-                        img.close()
-                    elif xobject[obj]['/Filter'] == '/JPXDecode':
-                        img = open(obj[1:] + ".jp2", "wb")
-                        img.write(data)
-                        img.close()
-                    elif xobject[obj]['/Filter'] == '/CCITTFaxDecode':
-                        img = open(obj[1:] + ".tiff", "wb")
-                        img.write(data)
-                        img.close()
-                else:
-                    img = Image.frombytes(mode, size, data)
-                    if img.height > 100:
-                        img.save(str(job_number) + ".png")
 
+def decode_image(image):
+    """
+    Turns an image XObject into a PIL image.
+    JPEG and JPEG 2000 streams are handed to PIL as they are, they are only decoded once the pixels are needed.
+    :image: the image XObject dictionary
+    :return: PIL image, or None if the encoding or color space is not supported
+    """
+    import PyPDF2
+    from PIL import Image
+
+    filters = resolved(image.get('/Filter', []))
+    if not isinstance(filters, list):
+        filters = [filters]
+    filters = [resolved(image_filter) for image_filter in filters]
+    size = (image['/Width'], image['/Height'])
+
+    if filters and filters[-1] in ('/DCTDecode', '/JPXDecode'):
+        if len(filters) > 1:
+            logging.info(f'Image filters {filters} not supported, skipping preview.')
+            return None
+        try:
+            preview = Image.open(io.BytesIO(image._data))
+        except OSError as e:
+            logging.info(f'Could not open {filters[-1]} preview: {e}')
+            return None
+        # The stream is kept so the extraction cache can store it as it is, without decoding the pixels.
+        preview.info[ENCODED_PREVIEW] = image._data
+        return preview
+    if any(image_filter not in ('/FlateDecode', '/Fl', '/LZWDecode', '/ASCII85Decode', '/ASCIIHexDecode')
+           for image_filter in filters):
+        logging.info(f'Image filters {filters} not supported, skipping preview.')
+        return None
+
+    # Palette images keep their indexes, the palette is looked up in the base color space.
+    color_space = resolved(image.get('/ColorSpace'))
+    palette = None
+    if isinstance(color_space, list) and resolved(color_space[0]) == '/Indexed':
+        base_mode = color_space_mode(resolved(color_space[1]))
+        colors = resolved(color_space[2]) + 1
+        lookup = resolved(color_space[3])
+        if isinstance(lookup, PyPDF2.generic.StreamObject):
+            lookup = lookup.getData()
+        elif isinstance(lookup, PyPDF2.generic.TextStringObject):
+            lookup = lookup.original_bytes
+        if base_mode is None or base_mode == 'P':
+            logging.info(f'Palette color space {color_space[1]} not supported, skipping preview.')
+            return None
+        palette = Image.frombytes(base_mode, (colors, 1), bytes(lookup)[:colors * len(base_mode)]).convert('RGB')
+        mode = 'P'
     else:
-        print("No image found.")
-    pdf_obj.close()
+        mode = color_space_mode(color_space)
+
+    modes = image_raw_modes.get((mode, resolved(image.get('/BitsPerComponent', 8))))
+    if modes is None:
+        logging.info(f'Color space {color_space} not supported, skipping preview.')
+        return None
+    preview = Image.frombytes(modes[0], size, image.getData(), 'raw', modes[1])
+    if palette is not None:
+        preview.putpalette(palette.tobytes())
+    return preview
+
+
+def resolved(value):
+    """ The object an indirect reference points to. Dictionary .get does not follow references like [] does. """
+    return value.getObject() if hasattr(value, 'getObject') else value
+
+
+def color_space_mode(color_space):
+    """ PIL mode of a device or ICC based color space, None for the others. """
+    if isinstance(color_space, list):
+        if resolved(color_space[0]) == '/ICCBased':
+            return {1: 'L', 3: 'RGB', 4: 'CMYK'}.get(resolved(resolved(color_space[1]).get('/N')))
+        return None
+    return {'/DeviceRGB': 'RGB', '/DeviceGray': 'L', '/DeviceCMYK': 'CMYK', '/CalRGB': 'RGB',
+            '/CalGray': 'L'}.get(color_space)
 
 
-def excel_to_pdf(folder_path):
-    """ Goes through all files in a folder that are excel files, appends '_m' and saves as PDF format. """
-    os.chdir(folder_path)
-    for file in os.listdir('.'):
-        if file.endswith('.xlsx'):
+@timed('excel_to_pdf')
+def excel_to_pdf(folder_path, backend=None, rescan=False):
+    """
+    Goes through all files in a folder that are excel files, appends '_m' and saves as PDF format.
+    :folder_path: path to the directory containing the excel travelers
+    :backend: name of the export backend in export_backends, defaults to default_export_backend()
+    :rescan: export every workbook, even those whose PDF the manifest shows as up to date
+    :return: None
+    """
+    # Excel and LibreOffice need absolute paths to open and export workbooks.
+    folder_path = Path(folder_path).resolve()
+    manifest = Manifest(folder_path)
+    filenames = set(os.listdir(folder_path))
+    conversions = []
+    for file in sorted(filenames):
+        if file.endswith('.xlsx') and not file.startswith(SUMMARY_PREFIX):
+            if not rescan and manifest.is_current(folder_path / file, filenames):
+                logging.debug(f'{file} is unchanged since its PDF was exported. Skipping.')
+                continue
             logging.debug(f'Converting {file} from excel to PDF.')
 
-            output_file = file.split('.')[0] + '_m.pdf'
+            output_file = file.split('.')[0] + EXPORTED_PDF_SUFFIX
             logging.debug(f'File name will be {output_file}')
+            conversions.append((folder_path / file, folder_path / output_file))
+
+    # The whole list is handed to the backend at once, so it only starts up a single time.
+    if conversions:
+        export_backends[backend or default_export_backend()](conversions)
+
+    record_exports(manifest, conversions)
+    manifest.save()
+
+
+def record_exports(manifest, conversions):
+    """ Records the (workbook, pdf) path pairs that were really exported, failures are tried again next run.
+        The exported PDFs are recorded too, so read_document never mistakes them for travelers. """
+    for workbook_path, output_path in conversions:
+        if output_path.is_file():
+            manifest.record(workbook_path, WORKBOOK, [output_path.name])
+            manifest.record(output_path, EXPORTED_PDF, [])
+
+
+def default_export_backend():
+    """ Excel on Windows, LibreOffice when it is installed, otherwise the built-in renderer. """
+    if sys.platform == 'win32':
+        return 'excel'
+    if find_soffice() is not None:
+        return 'libreoffice'
+    return 'python'
 
-            app = client.DispatchEx("Excel.Application")
-            app.Interactive = False
-            app.Visible = False
-            workbook = app.Workbooks.Open(folder_path + '\\' + file)
 
-            print_area = 'A1:C26'
+def export_with_excel(conversions):
+    """ Exports (workbook, pdf) path pairs with Excel, a single Excel instance converts the whole list. """
+    from win32com import client
+    # Import win32api is not used in code but necessary for pyinstaller creation of .exe file.
+    import win32api  # noqa: F401
+
+    app = client.DispatchEx("Excel.Application")
+    app.Interactive = False
+    app.Visible = False
+    try:
+        for workbook_path, output_path in conversions:
+            workbook = app.Workbooks.Open(str(workbook_path))
+
             ws = workbook.Worksheets[0]
             ws.PageSetup.Zoom = False
             ws.PageSetup.FitToPagesTall = 2
             ws.PageSetup.FitToPagesWide = 1
-            ws.PageSetup.PrintArea = print_area
+            ws.PageSetup.PrintArea = PRINT_AREA
             workbook.WorkSheets(1).Select()
 
             try:
-                workbook.ActiveSheet.ExportAsFixedFormat(0, folder_path + '\\' + output_file)
+                workbook.ActiveSheet.ExportAsFixedFormat(0, str(output_path))
             except Exception as e:
-                print("Failed to convert in PDF format.")
-                print(str(e))
+                logging.warning(f'Failed to convert {workbook_path.name} in PDF format. {e}')
             finally:
                 workbook.Close(False)
-                app.Quit()
                 workbook = None
+    finally:
+        app.Quit()
+
+
+def find_soffice():
+    """ Returns the path of the LibreOffice executable, or None when LibreOffice is not installed. """
+    for name in ('soffice', 'libreoffice'):
+        path = shutil.which(name)
+        if path is not None:
+            return path
+    default_path = Path(os.environ.get('PROGRAMFILES', 'C:\\Program Files')) / 'LibreOffice/program/soffice.exe'
+    if default_path.is_file():
+        return str(default_path)
+    return None
+
+
+def export_with_libreoffice(conversions):
+    """ Exports (workbook, pdf) path pairs with headless LibreOffice, converting many workbooks per invocation.
+        The workbooks carry their own print area and page setup, see create_excel. """
+    soffice = find_soffice()
+    if soffice is None:
+        logging.warning('Failed to convert in PDF format, LibreOffice (soffice) was not found.')
+        return
+
+    # A private profile so a running LibreOffice window can not take over (or block) the conversion.
+    with tempfile.TemporaryDirectory() as profile_dir, tempfile.TemporaryDirectory() as out_dir:
+        for batch_start in range(0, len(conversions), LIBREOFFICE_BATCH_SIZE):
+            batch = conversions[batch_start:batch_start + LIBREOFFICE_BATCH_SIZE]
+            command = [soffice, f'-env:UserInstallation={Path(profile_dir).as_uri()}', '--headless', '--norestore',
+                       '--convert-to', 'pdf', '--outdir', out_dir] + [str(workbook_path) for workbook_path, _ in batch]
+            logging.debug(f'Running {command}')
+            timeout = LIBREOFFICE_TIMEOUT_SECONDS + LIBREOFFICE_WORKBOOK_SECONDS * len(batch)
+            try:
+                completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                logging.warning(f'Failed to convert in PDF format, LibreOffice did not finish within {timeout} seconds '
+                                'and was stopped.')
+            else:
+                if completed.returncode != 0:
+                    logging.warning(f'Failed to convert in PDF format, LibreOffice exited with code '
+                                    f'{completed.returncode}: {completed.stderr.decode(errors="replace").strip()}')
+
+            # LibreOffice names the output after the workbook, move it to the '_m' name next to the workbook.
+            for workbook_path, output_path in batch:
+                converted = Path(out_dir) / (workbook_path.stem + '.pdf')
+                if converted.is_file():
+                    shutil.move(converted, output_path)
+                else:
+                    logging.warning(f'Failed to convert in PDF format, LibreOffice did not convert '
+                                    f'{workbook_path.name}.')
+
+
+def export_with_python(conversions):
+    """ Exports (workbook, pdf) path pairs with the built-in renderer, no office suite needed. """
+    for workbook_path, output_path in conversions:
+        try:
+            render_traveler_pdf(workbook_path, output_path)
+        except Exception as e:
+            logging.warning(f'Failed to convert {workbook_path.name} in PDF format. {e}')
+
+
+def render_traveler_pdf(workbook_path, output_path):
+    """
+    Draws the print area of an excel traveler straight to a PDF: cell text, borders and the preview image.
+    Rows are split over letter pages like Excel's fit to 1 page wide, scaling down only when too wide.
+    :workbook_path: path to the excel traveler
+    :output_path: path of the PDF to write
+    :return: None
+    """
+    import openpyxl
+    from openpyxl.cell.cell import MergedCell
+    from openpyxl.utils import get_column_letter, range_boundaries
+    from PIL import Image
+
+    sheet = openpyxl.load_workbook(workbook_path).worksheets[0]
+    min_col, min_row, max_col, max_row = range_boundaries(PRINT_AREA)
+    margins = sheet.page_margins
+
+    # Column widths (characters) and row heights (points) of the print area, in points.
+    col_widths = {}
+    for col in range(min_col, max_col + 1):
+        width = sheet.column_dimensions[get_column_letter(col)].width or 8.43
+        col_widths[col] = (width * 7 + 5) * 0.75
+    row_heights = {row: sheet.row_dimensions[row].height or 15 for row in range(min_row, max_row + 1)}
+
+    page_width, page_height = 612, 792
+    left, top = margins.left * 72, margins.top * 72
+    printable_height = page_height - (margins.top + margins.bottom) * 72
+    scale = min(1, (page_width - (margins.left + margins.right) * 72) / sum(col_widths.values()))
+
+    # Sheet position of every column and row edge, used for cells, merged ranges and images alike.
+    col_x = {min_col: 0}
+    for col in range(min_col, max_col + 1):
+        col_x[col + 1] = col_x[col] + col_widths[col] * scale
+    row_y = {min_row: 0}
+    for row in range(min_row, max_row + 1):
+        row_y[row + 1] = row_y[row] + row_heights[row] * scale
+
+    # Split the rows into pages, every page starts at the top margin.
+    pages = [[]]
+    for row in range(min_row, max_row + 1):
+        if pages[-1] and row_y[row + 1] - row_y[pages[-1][0]] > printable_height:
+            pages.append([])
+        pages[-1].append(row)
+
+    # Merged range of every cell that is part of one.
+    merged = {}
+    for merged_range in sheet.merged_cells.ranges:
+        for row, col in merged_range.cells:
+            merged[(row, col)] = merged_range
+
+    canvas = PdfCanvas(page_width, page_height)
+    for rows in pages:
+        canvas.new_page()
+        offset = top - row_y[rows[0]]
+        for row in rows:
+            for col in range(min_col, max_col + 1):
+                cell = sheet.cell(row=row, column=col)
+                x1, x2 = left + col_x[col], left + col_x[col + 1]
+                y1, y2 = offset + row_y[row], offset + row_y[row + 1]
+
+                # Borders, double lines are drawn heavier. Merged ranges only have borders on their outline.
+                merged_range = merged.get((row, col))
+                for side, (ax, ay, bx, by) in (('left', (x1, y1, x1, y2)), ('right', (x2, y1, x2, y2)),
+                                               ('top', (x1, y1, x2, y1)), ('bottom', (x1, y2, x2, y2))):
+                    if merged_range is not None and not {
+                            'left': col == merged_range.min_col, 'right': col == merged_range.max_col,
+                            'top': row == merged_range.min_row, 'bottom': row == merged_range.max_row}[side]:
+                        continue
+                    style = getattr(cell.border, side).style
+                    if style is not None:
+                        canvas.line(ax, ay, bx, by, 1.5 if style == 'double' else 0.5)
+
+                if cell.value is None or isinstance(cell, MergedCell):
+                    continue
+
+                # Merged ranges draw their text over the whole range, clipped to the page.
+                if merged_range is not None:
+                    x2 = left + col_x[min(merged_range.max_col, max_col) + 1]
+                    y2 = offset + row_y[min(merged_range.max_row, rows[-1]) + 1]
+                canvas.text_box(str(cell.value), x1, y1, x2, y2, (cell.font.sz or 11) * scale, bool(cell.font.b),
+                                cell.alignment.horizontal, cell.alignment.vertical)
+
+        # Images are anchored to the sheet, only the ones starting on this page are drawn.
+        for img in sheet._images:
+            x, y = image_position(img.anchor, col_x, row_y, scale)
+            if row_y[rows[0]] <= y < row_y[rows[-1] + 1]:
+                preview = Image.open(io.BytesIO(img._data()))
+                canvas.image(preview, left + x, offset + y, img.width * 0.75 * scale, img.height * 0.75 * scale)
+
+    canvas.save(output_path)
+
+
+def image_position(anchor, col_x, row_y, scale):
+    """ Converts an openpyxl image anchor to a scaled (x, y) position in points from the top left of the sheet. """
+    from openpyxl.drawing.spreadsheet_drawing import AbsoluteAnchor
+
+    if isinstance(anchor, AbsoluteAnchor):
+        return anchor.pos.x / 12700 * scale, anchor.pos.y / 12700 * scale
+    marker = anchor._from
+    return (col_x.get(marker.col + 1, 0) + marker.colOff / 12700 * scale,
+            row_y.get(marker.row + 1, 0) + marker.rowOff / 12700 * scale)
+
+
+class PdfCanvas:
+    """ Minimal PDF writer for the built-in export backend: Helvetica text, lines and RGB images.
+        Coordinates are in points from the top left of the page. """
+
+    # Helvetica character widths (1/1000 of the font size) for ASCII 32 to 126, anything else uses 556.
+    helvetica_widths = [
+        278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278, 556, 556, 556, 556, 556, 556,
+        556, 556, 556, 556, 278, 278, 584, 584, 584, 556, 1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667,
+        556, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556, 333, 556,
+        556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500, 278, 556, 500, 722,
+        500, 500, 500, 334, 260, 334, 584]
+
+    def __init__(self, width=612, height=792):
+        self.width = width
+        self.height = height
+        self.pages = []
+        self.images = []
+
+    def new_page(self):
+        self.pages.append([])
+
+    def string_width(self, string, size, bold=False):
+        width = sum(self.helvetica_widths[ord(char) - 32] if 32 <= ord(char) <= 126 else 556 for char in string)
+        return width * size / 1000 * (1.06 if bold else 1)
+
+    def text(self, x, y, string, size=11, bold=False):
+        """ Draws a single line of text with its baseline at y. """
+        encoded = string.encode('cp1252', 'replace').replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+        self.pages[-1].append(b'BT /F%d %.2f Tf %.2f %.2f Td (%s) Tj ET' % (
+            2 if bold else 1, size, x, self.height - y, encoded))
+
+    def text_box(self, string, x1, y1, x2, y2, size=11, bold=False, horizontal=None, vertical=None):
+        """ Draws word wrapped text inside a box, aligned like an excel cell. Lines that do not fit are dropped. """
+        padding = 2
+        lines = []
+        for paragraph in string.split('\n'):
+            line = ''
+            for word in paragraph.split(' '):
+                candidate = word if not line else line + ' ' + word
+                if line and self.string_width(candidate, size, bold) > x2 - x1 - 2 * padding:
+                    lines.append(line)
+                    line = word
+                else:
+                    line = candidate
+            lines.append(line)
+
+        leading = size * 1.2
+        lines = lines[:max(1, int((y2 - y1) // leading))]
+        if vertical == 'top':
+            y = y1 + padding
+        elif vertical == 'center':
+            y = (y1 + y2 - leading * len(lines)) / 2
+        else:
+            y = y2 - padding - leading * len(lines)
+
+        for line in lines:
+            y += leading
+            width = self.string_width(line, size, bold)
+            if horizontal == 'center':
+                x = (x1 + x2 - width) / 2
+            elif horizontal == 'right':
+                x = x2 - padding - width
+            else:
+                x = x1 + padding
+            self.text(x, y - size * 0.25, line, size, bold)
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        self.pages[-1].append(b'%.2f w %.2f %.2f m %.2f %.2f l S' % (
+            width, x1, self.height - y1, x2, self.height - y2))
+
+    def image(self, image, x, y, width, height):
+        """ Draws a PIL image with its top left corner at (x, y), transparency is flattened onto white. """
+        if image.mode in ('RGBA', 'LA', 'P'):
+            from PIL import Image
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        image = image.convert('RGB')
+        self.images.append(image)
+        self.pages[-1].append(b'q %.2f 0 0 %.2f %.2f %.2f cm /Im%d Do Q' % (
+            width, height, x, self.height - y - height, len(self.images)))
+
+    def tobytes(self):
+        objects = []
+
+        def add(content):
+            objects.append(content)
+            return len(objects)
+
+        catalog = add(None)
+        pages = add(None)
+        fonts = [add(b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>' % name)
+                 for name in (b'Helvetica', b'Helvetica-Bold')]
+        images = []
+        for image in self.images:
+            data = zlib.compress(image.tobytes())
+            images.append(add(b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB '
+                              b'/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream'
+                              % (image.width, image.height, len(data), data)))
+        resources = b'<< /Font << /F1 %d 0 R /F2 %d 0 R >> /XObject << %s >> >>' % (
+            fonts[0], fonts[1], b' '.join(b'/Im%d %d 0 R' % (i + 1, ref) for i, ref in enumerate(images)))
+
+        kids = []
+        for operations in self.pages:
+            data = zlib.compress(b'\n'.join(operations))
+            contents = add(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(data), data))
+            kids.append(add(b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>'
+                            % (pages, self.width, self.height, resources, contents)))
+        objects[catalog - 1] = b'<< /Type /Catalog /Pages %d 0 R >>' % pages
+        objects[pages - 1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            b' '.join(b'%d 0 R' % kid for kid in kids), len(kids))
+
+        output = bytearray(b'%PDF-1.4\n')
+        offsets = []
+        for number, content in enumerate(objects, 1):
+            offsets.append(len(output))
+            output += b'%d 0 obj\n%s\nendobj\n' % (number, content)
+        xref = len(output)
+        output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+        output += b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, catalog, xref)
+        return bytes(output)
+
+    def save(self, path):
+        with open(path, 'wb') as pdf_file_obj:
+            pdf_file_obj.write(self.tobytes())
+
+
+# Export backends for excel_to_pdf, each one converts a list of (workbook path, pdf path) pairs.
+export_backends = {
+    'excel': export_with_excel,
+    'libreoffice': export_with_libreoffice,
+    'python': export_with_python,
+}
 
 
 def process_notes(string):
@@ -505,24 +2499,17 @@ def process_notes(string):
     logging.debug(f'Notes to process: \n{string}')
     new_string = ''
 
-    thread_pattern = re.compile(r'(Threads/Tapped Holes: \n)(\d+)', re.DOTALL)
-    insert_pattern = re.compile(r'Inserts:.*?(\d+)', re.DOTALL)
-    tolerance_pattern = re.compile(r'Tolerances: \n(.*?)\n', re.DOTALL)
-    roughness_pattern = re.compile(r'.*Surface Roughness: \n.*?ish (\d.*?)(?:Ra, )(speci\nc area|entire part).*?(?:Part|Notes).*', re.DOTALL)
-    marking_pattern = re.compile(r'Part Markings: \n(.*?)Notes:', re.DOTALL)
-    main_notes_pattern = re.compile(r'Notes:(.*)', re.DOTALL)
-
-    thread_matches = thread_pattern.search(string)
+    thread_matches = notes_thread_pattern.search(string)
     logging.debug(f'thread_matches: {thread_matches}')
-    insert_matches = insert_pattern.search(string)
+    insert_matches = notes_insert_pattern.search(string)
     logging.debug(f'thread_matches: {insert_matches}')
-    tolerance_matches = tolerance_pattern.search(string)
+    tolerance_matches = notes_tolerance_pattern.search(string)
     logging.debug(f'tolerance_matches: {tolerance_matches}')
-    roughness_matches = roughness_pattern.search(string)
+    roughness_matches = roughness_search(string)
     logging.debug(f'roughness_matches: {roughness_matches}')
-    marking_matches = marking_pattern.search(string)
+    marking_matches = notes_marking_pattern.search(string)
     logging.debug(f'marking_matches: {marking_matches}')
-    main_matches = main_notes_pattern.search(string)
+    main_matches = notes_main_pattern.search(string)
     logging.debug(f'main_matches: {main_matches}')
 
     if thread_matches is not None:
@@ -535,7 +2522,7 @@ def process_notes(string):
         new_string += '\nTolerances: ' + remove_newlines(tolerance_matches.group(1)) + '\n'
         logging.debug(f'current new string after tolerance_matches: \n{new_string}')
     if roughness_matches is not None:
-        new_string += '\nSurface Roughness: ' + remove_newlines(roughness_matches.group(1)) + ' Ra, ' + regex_specic_check(remove_newlines(roughness_matches.group(2))) + '\n'
+        new_string += '\nSurface Roughness: ' + remove_newlines(roughness_matches[0]) + ' Ra, ' + normalize_text(remove_newlines(roughness_matches[1])) + '\n'
         logging.debug(f'current new string after roughness_matches: \n{new_string}')
     if marking_matches is not None:
         new_string += '\nPart Markings: ' + remove_newlines(marking_matches.group(1)) + '\n'
@@ -547,6 +2534,33 @@ def process_notes(string):
     return new_string
 
 
+def roughness_search(string):
+    """ Finds the Surface Roughness value and area in the 'Notes' section, preferring the last 'Surface Roughness'
+        label that has a value. Every label, value and area is located in a single forward scan first, so
+        there is nothing to backtrack over. Returns a tuple of (value, area), or None when not found. """
+    labels = [matches.end() for matches in roughness_label_pattern.finditer(string)]
+    if not labels:
+        return None
+    values = [matches.end() for matches in roughness_value_pattern.finditer(string)]
+    areas = list(roughness_area_pattern.finditer(string))
+    area_starts = [matches.start() for matches in areas]
+
+    # A 'Part' or 'Notes' label has to follow the area.
+    last_label = max(string.rfind('Part'), string.rfind('Notes'))
+
+    for label in reversed(labels):
+        # Value starts at the first 'ish ' followed by a digit after the label, the area is the first one after it.
+        value = bisect.bisect_left(values, label + 4)
+        if value == len(values):
+            continue
+        area = bisect.bisect_left(area_starts, values[value] + 1)
+        if area == len(areas) or areas[area].end() > last_label:
+            continue
+        return string[values[value]:area_starts[area]], areas[area].group(1)
+
+    return None
+
+
 def remove_newlines(string):
     """ Remove new lines from a string. """
     new_string = string.replace('\n', '')
@@ -555,90 +2569,362 @@ def remove_newlines(string):
 
 def low_up(string):
     """ Insert space between lowercase letters against uppercase letters. """
-    new_string = re.sub(r'([a-z](?=[A-Z])|[A-Z](?=[A-Z][a-z]))', r'\1 ', string)
-    return new_string
-
-
-def remove_l_stroke(string):
-    """ Remove L stroke character that gets parsed by the PyPDF2 for bullets. """
-    new_string = re.sub(r'Ł', '', string)
-    return new_string
-
-
-def replace_trademark(string):
-    """ Replace trademark character for apostrophe. """
-    new_string = re.sub(r'™', '\'', string)
-    return new_string
-
-
-def replace_fluid(string):
-    """ Replace fluid character for double apostrophe. """
-    new_string = re.sub(r'ﬂ', '\"', string)
+    new_string = low_up_pattern.sub(r'\1 ', string)
     return new_string
 
 
-def regex_certificate_check(string):
-    """ Check for 'certicate/certication' since PyPDF2 has a hard time parsing the kerning in certificate. """
-    new_string = re.sub(r'(certic|Certic)', 'Certific', string)
-    return new_string
+def normalize_text(string):
+    """ Repairs the characters and kerning PyPDF2 gets wrong in a single pass: bullets are removed, trademark
+        and fluid characters become apostrophes, and words missing their 'fi' ligature are spelled out again. """
+    new_string = string.translate(pdf_text_translation)
+    return ligature_pattern.sub(lambda matches: ligature_fixes[matches.group(0)], new_string)
 
 
-def regex_specic_check(string):
-    """ Check for 'specic' since PyPDF2 has a hard time parsing the kerning in specific. """
-    new_string = re.sub(r'specic', 'specific', string)
-    return new_string
+@timed('open_parse_pdf')
+def open_parse_pdf(document):
+    """ Extracts all of the text data from every page of an opened PdfDocument """
+    parse_string = document.text()
+    logging.debug(f'parse_string is: \n{parse_string}')
 
+    return normalize_text(parse_string)
 
-def regex_film_check(string):
-    """ Check for 'Chem-lm' since PyPDF2 has a hard time parsing the kerning in Chem-film. """
-    new_string = re.sub(r'Chem-lm', 'Chem-Film', string)
-    return new_string
 
+def stream_parse_pdf(document):
+    """ Yields the text data of an opened PdfDocument one page at a time, pages are extracted lazily. """
+    for page_text in document.iter_page_text():
+        yield normalize_text(page_text)
 
-def open_parse_pdf(filename):
-    """ Opens a PDF file and extracts all of the text data from every page """
 
-    # Opens the file in cwd, makes a reader object, and appends string to parse_string every time page is looped.
-    pdf_file_obj = open(filename, 'rb')
-    pdf_reader = PyPDF2.PdfFileReader(pdf_file_obj)
-    num_pages = pdf_reader.numPages
+def search_pdf(document, pattern, max_span=None):
+    """
+    Searches the text of an opened PdfDocument page by page and stops extracting pages once the pattern matches.
+    A match is only trusted once more text follows it, for patterns ending on a fixed character such as the
+    PO Part ID this is the same match a search of the whole text would give.
+    Pages are appended to a single buffer. With max_span, the longest match of the pattern, every search starts
+    max_span characters before the new page, a match starting further back would have been found on an earlier page.
+    :document: opened PdfDocument
+    :pattern: compiled regex pattern
+    :max_span: longest match of the pattern in characters, None searches the whole buffer every page
+    :return: the match object, or None if the pattern is not in the document
+    """
     parse_string = ''
-    for i in range(0, num_pages):
-        page_obj = pdf_reader.getPage(i)
-        parse_string += page_obj.extractText()
-
-    # Close the document after getting all the information.
-    pdf_file_obj.close()
-    logging.debug(f'parse_string is: \n{parse_string}')
-
-    return remove_l_stroke(parse_string)
+    start = 0
+    for page_text in stream_parse_pdf(document):
+        if max_span is not None:
+            start = max(0, len(parse_string) - max_span)
+        parse_string += page_text
+        matches = pattern.search(parse_string, start)
+        if matches is not None and matches.end() < len(parse_string):
+            return matches
+    return pattern.search(parse_string, start)
 
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
     try:
         # PyInstaller creates a temp folder and stores path in _MEIPASS
-        base_path = sys._MEIPASS
+        base_path = Path(sys._MEIPASS)
     except Exception:
-        base_path = os.path.abspath(".")
-
-    return os.path.join(base_path, relative_path)
+        base_path = Path(__file__).resolve().parent
+
+    return base_path / relative_path
+
+
+@dataclasses.dataclass
+class TravelerRecord:
+    """ A customer traveler parsed by parse_traveler. """
+    __slots__ = ('path', 'sha256', 'job_number', 'po_number', 'due_date', 'contact', 'part_file', 'quantity',
+                 'finish', 'material', 'certifications', 'inspection', 'notes', 'image')
+    path: str
+    sha256: str
+    job_number: str
+    po_number: str
+    due_date: str
+    contact: str
+    part_file: str
+    quantity: str
+    finish: str
+    material: str
+    certifications: str
+    inspection: str
+    notes: str
+    image: object
+
+    @classmethod
+    def from_dictionary(cls, path, sha256, traveler_dictionary):
+        """ Record of a traveler dictionary returned by traveler_process. """
+        return cls(str(path), sha256, **{field: traveler_dictionary[field] for field in cls.__slots__[2:]})
+
+    def to_dict(self):
+        """ Dictionary ready for JSON, holding the size of the preview image instead of the image. """
+        record = {'type': TRAVELER}
+        record.update((field, getattr(self, field)) for field in self.__slots__[:-1])
+        record['preview_size'] = None if self.image is None else list(self.image.size)
+        return record
+
+
+@dataclasses.dataclass
+class PurchaseOrderRecord:
+    """ An Xometry purchase order parsed by parse_po. """
+    __slots__ = ('path', 'sha256', 'job_number')
+    path: str
+    sha256: str
+    job_number: str
+
+    def to_dict(self):
+        return {'type': PURCHASE_ORDER, 'path': self.path, 'sha256': self.sha256, 'job_number': self.job_number}
+
+
+@dataclasses.dataclass
+class DocumentRecord:
+    """ What process_folder did, or would do with dry_run, with a single file of the folder.
+        new_name is None for files that are not renamed, workbook is the excel traveler made from a traveler.
+        error is the message of a file that could not be parsed, None for the others. """
+    __slots__ = ('path', 'document_type', 'job_number', 'new_name', 'workbook', 'error')
+    path: str
+    document_type: str
+    job_number: str
+    new_name: str
+    workbook: str
+    error: str
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+@dataclasses.dataclass
+class ProcessOptions:
+    """ Options of process_folder, see read_document and excel_to_pdf.
+        export is the name of an export backend, the excel travelers are only exported to PDF when it is set. """
+    jobs: int = 1
+    rescan: bool = False
+    dry_run: bool = False
+    export: str = None
+    summary_format: str = None
+    io_concurrency: int = None
+
+
+def parse_document(path):
+    """ Parses a single PDF without renaming or creating anything.
+        Returns a TravelerRecord, a PurchaseOrderRecord, or None if it is neither.
+        Raises ValueError if the file can not be read or parsed. """
+    document_type, _, value, sha256 = process_document(Path(path))
+    if document_type == PARSE_ERROR:
+        raise ValueError(value)
+    if document_type == TRAVELER:
+        return TravelerRecord.from_dictionary(path, sha256, value)
+    if document_type == PURCHASE_ORDER:
+        return PurchaseOrderRecord(str(path), sha256, value)
+    return None
+
+
+def parse_traveler(path):
+    """ Parses a single customer traveler PDF into a TravelerRecord, raises ValueError if it is not a traveler. """
+    record = parse_document(path)
+    if not isinstance(record, TravelerRecord):
+        raise ValueError(f'{path} is not an Xometry traveler')
+    return record
+
+
+def parse_po(path):
+    """ Parses a single purchase order PDF into a PurchaseOrderRecord, raises ValueError if it is not a PO. """
+    record = parse_document(path)
+    if not isinstance(record, PurchaseOrderRecord):
+        raise ValueError(f'{path} is not an Xometry purchase order')
+    return record
+
+
+def process_folder(folder_path, options=None):
+    """
+    Processes a folder like the interactive script does, without prompting.
+    Drawings and travelers are renamed and the excel travelers created, they are only exported to PDF when
+    options.export names an export backend. With options.dry_run nothing in the folder is changed.
+    :folder_path: path to the folder of travelers, purchase orders and drawings
+    :options: ProcessOptions, the defaults when not given
+    :return: list of DocumentRecord, one per file that was handled or renamed, in filename order
+    """
+    options = options or ProcessOptions()
+    folder_path = Path(folder_path)
+    results, renames = read_document(folder_path, jobs=options.jobs, rescan=options.rescan,
+                                     summary_format=options.summary_format, io_concurrency=options.io_concurrency,
+                                     dry_run=options.dry_run)
+    if options.export is not None and not options.dry_run:
+        excel_to_pdf(folder_path, backend=options.export, rescan=options.rescan)
+
+    new_names = dict(renames)
+    records = {}
+    for document_type, filename, value, _ in results:
+        job_number = value if document_type == PURCHASE_ORDER else None
+        workbook = None
+        error = None
+        if document_type == TRAVELER:
+            job_number = value['job_number']
+            workbook = f'CT {job_number}.xlsx'
+        elif document_type == PARSE_ERROR:
+            document_type = None
+            error = value
+        records[filename] = DocumentRecord(str(folder_path / filename), document_type, job_number,
+                                           new_names.get(filename), workbook, error)
+
+    # Drawings are skipped by process_document, and drawing images are not PDFs, they are known by their renames.
+    for filename, new_file_name in renames:
+        matches = FolderIndex.drawing_pattern.search(filename)
+        record = records.setdefault(filename, DocumentRecord(str(folder_path / filename), None, None,
+                                                             new_file_name, None, None))
+        if record.document_type is None and matches is not None:
+            record.document_type = DRAWING
+            record.job_number = matches.group(1)
+    return [records[filename] for filename in sorted(records)]
+
+
+def write_record(record, output, as_json=False):
+    """ Writes a record of a command as a line of JSON or of text, flushed right away. """
+    fields = record if isinstance(record, dict) else record.to_dict()
+    if as_json:
+        line = json.dumps(fields)
+    elif fields.get('error'):
+        line = f'{fields["path"]}: error: {fields["error"]}'
+    elif 'recovered' in fields:
+        line = f'{fields["path"]}: {fields["recovered"]} files moved'
+    else:
+        kind = fields.get('type', fields.get('document_type')) or '-'
+        line = f'{fields["path"]}: {kind} {fields.get("job_number") or ""}'.rstrip()
+        if fields.get('new_name'):
+            line += f' -> {fields["new_name"]}'
+        if fields.get('workbook'):
+            line += f', {fields["workbook"]}'
+    output.write(line + '\n')
+    output.flush()
+
+
+def run_command(args, output):
+    """ Runs the process, parse or recover command, returns the exit status: 1 if a file could not be parsed.
+        Files and folders that fail are written as records with the path and error, the others are still handled. """
+    status = 0
+    if args.command == 'process':
+        options = ProcessOptions(jobs=args.jobs, rescan=args.rescan, dry_run=args.dry_run, export=args.export,
+                                 summary_format=args.summary, io_concurrency=args.io_concurrency)
+        for folder_path in args.folders:
+            try:
+                records = process_folder(folder_path, options)
+            except OSError as e:
+                records = [{'path': folder_path, 'error': str(e)}]
+            for record in records:
+                if isinstance(record, dict) or record.error is not None:
+                    status = 1
+                write_record(record, output, args.json)
+    elif args.command == 'recover':
+        for folder_path in args.folders:
+            write_record({'path': folder_path, 'recovered': recover_renames(folder_path, args.rollback)}, output,
+                         args.json)
+    else:
+        for path in args.files:
+            try:
+                record = parse_document(path)
+            except ValueError as e:
+                record = {'path': path, 'error': str(e)}
+                status = 1
+            if record is None:
+                record = {'path': path, 'type': None}
+            write_record(record, output, args.json)
+    return status
+
+
+def add_run_options(parser, suppress=False):
+    """ Adds the options of processing a folder. Subcommands suppress their defaults, so the same options
+        given before the subcommand are kept. """
+    def default(value):
+        return argparse.SUPPRESS if suppress else value
+
+    parser.add_argument('--jobs', type=int, default=default(1), metavar='N',
+                        help='number of worker processes used to parse the PDFs, 0 uses every CPU (default: 1)')
+    parser.add_argument('--rescan', action='store_true', default=default(False),
+                        help='ignore the folder manifest and process every file again')
+    parser.add_argument('--export', choices=sorted(export_backends), default=default(None),
+                        help='how excel travelers are exported to PDF (default: excel on Windows, '
+                             'libreoffice when installed, otherwise python; the process command only exports '
+                             'when it is given)')
+    parser.add_argument('--summary', choices=['xlsx', 'csv'], default=default(None),
+                        help='also write every traveler of a run to one batch summary file (not used with --watch)')
+    parser.add_argument('--io-concurrency', type=int, default=default(None), metavar='N',
+                        help='read files and apply renames N at a time, for folders on network shares')
+
+
+def add_cache_options(parser, suppress=False):
+    """ Adds the metrics and extraction cache options, see add_run_options. """
+    parser.add_argument('--metrics', metavar='FILE', default=argparse.SUPPRESS if suppress else None,
+                        help='append per-stage timings and counters to FILE as JSON lines, and print a summary')
+    parser.add_argument('--no-cache', action='store_true', default=argparse.SUPPRESS if suppress else False,
+                        help='do not reuse or store what was extracted from PDFs in the extraction cache')
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Parses Xometry travelers and purchase orders in a folder.')
+    add_run_options(parser)
+    add_cache_options(parser)
+    parser.add_argument('--watch', nargs='+', metavar='FOLDER',
+                        help='keep running and process new files in the folders as soon as they are written')
+    parser.add_argument('--poll', action='store_true',
+                        help='with --watch, list the folders every few seconds instead of using inotify')
+
+    # Non-interactive commands, without a command the script asks for folders like it always did.
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    process_parser = commands.add_parser('process', help='process folders without prompting')
+    process_parser.add_argument('folders', nargs='+', metavar='FOLDER')
+    process_parser.add_argument('--dry-run', action='store_true',
+                                help='only report what would be renamed and created, change nothing')
+    process_parser.add_argument('--json', action='store_true', help='write one JSON record per file')
+    add_run_options(process_parser, suppress=True)
+    add_cache_options(process_parser, suppress=True)
+    parse_parser = commands.add_parser('parse', help='parse travelers and purchase orders, change nothing')
+    parse_parser.add_argument('files', nargs='+', metavar='FILE')
+    parse_parser.add_argument('--json', action='store_true', help='write one JSON record per file')
+    add_cache_options(parse_parser, suppress=True)
+    recover_parser = commands.add_parser('recover', help='finish the renames of a run that was interrupted, '
+                                                         'without processing the folders')
+    recover_parser.add_argument('folders', nargs='+', metavar='FOLDER')
+    recover_parser.add_argument('--rollback', action='store_true',
+                                help='move the files that were already renamed back to their original names')
+    recover_parser.add_argument('--json', action='store_true', help='write one JSON record per folder')
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable(args.metrics)
+    if args.no_cache:
+        extraction_cache.path = None
+
+    # Records are the only output of a command, anything else printed along the way goes to stderr.
+    if args.command is not None:
+        output = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            status = run_command(args, output)
+            if metrics.enabled:
+                metrics.flush()
+                print(metrics.summary())
+        sys.exit(status)
+
+    if args.watch:
+        watch_folders(args.watch, jobs=args.jobs, backend=args.export, poll=args.poll)
+        return
+
     print('Press CTRL+C or close the window to exit.')
     try:
         while True:
-            folder_path = input('Please paste the absolute folder path with the files you wish to process, '
-                                'or press CTRL+C to exit: \n')
+            folder_path = Path(input('Please paste the absolute folder path with the files you wish to process, '
+                                     'or press CTRL+C to exit: \n'))
             logging.info(f'Getting data from the following directory: {folder_path}')
-            read_document(folder_path)
-            rename_unlinked_drawings(folder_path)
-            excel_to_pdf(folder_path)
+            read_document(folder_path, jobs=args.jobs, rescan=args.rescan, summary_format=args.summary,
+                          io_concurrency=args.io_concurrency)
+            excel_to_pdf(folder_path, backend=args.export, rescan=args.rescan)
             print('Folder processed, please check files to make sure everything went accordingly.')
+            if metrics.enabled:
+                metrics.flush()
+                print(metrics.summary())
+                metrics.reset_summary()
     except KeyboardInterrupt:
         sys.exit()
 
 
 if __name__ == '__main__':
+    # Needed for the process pool when running as the pyinstaller .exe file.
+    multiprocessing.freeze_support()
     main()
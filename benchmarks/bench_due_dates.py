@@ -0,0 +1,67 @@
+#!usr/bin/env python3
+# bench_due_dates.py - times the due date rules of create_excel over many traveler dictionaries.
+# The legacy cascade compiled its patterns on every call and searched the fields up to six times, DueDateRules
+# scans every field once and moves all due dates in one numpy call.
+# usage: python benchmarks/bench_due_dates.py
+
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import XometryParsePDF  # noqa: E402
+
+finishes = ['Standard', 'Bead Blast', 'Custom Black Oxide', 'Custom with masking', 'Anodize Type II']
+materials = ['Aluminum 6061-T6', 'Steel 4140, through harden', 'Delrin']
+notes = ['Features: none', 'Features: heat treat to 40 HRC', 'Features: ' + 'deburr all edges. ' * 40]
+
+
+def legacy_due_date(traveler_dictionary):
+    """ The cascade create_excel used before DueDateRules, kept here as the baseline, calendar days included. """
+    date_time_obj = datetime.strptime(traveler_dictionary['due_date'], "%m/%d/%Y")
+    due_date = traveler_dictionary['due_date']
+    if traveler_dictionary['finish'] == 'Standard':
+        due_date = f'{date_time_obj.date() - timedelta(days=2):%m/%d/%Y}'
+    post_process_pattern = re.compile(r'(mask|masking|heat treat|heat treating|harden|through harden)')
+    for field in ('finish', 'material', 'notes'):
+        if post_process_pattern.search(traveler_dictionary[field]) is not None:
+            due_date = f'{date_time_obj.date() - timedelta(days=7):%m/%d/%Y}'
+    finish_pattern = re.compile(r'custom|CUSTOM|Custom')
+    mask_pattern = re.compile(r'mask|MASK|masking|MASKING')
+    if finish_pattern.search(traveler_dictionary['finish']) is not None:
+        due_date = f'{date_time_obj.date() - timedelta(days=5):%m/%d/%Y}'
+        for field in ('finish', 'material', 'notes'):
+            if mask_pattern.search(traveler_dictionary[field]) is not None:
+                due_date = f'{date_time_obj.date() - timedelta(days=7):%m/%d/%Y}'
+    elif traveler_dictionary['finish'] is not None:
+        due_date = f'{date_time_obj.date() - timedelta(days=3):%m/%d/%Y}'
+    if datetime.strptime(due_date, "%m/%d/%Y").date() < datetime.today().date():
+        due_date = 'ASAP'
+    return due_date
+
+
+def travelers(count):
+    rng = random.Random(0)
+    return [{'due_date': f'{rng.randrange(1, 13):02d}/{rng.randrange(1, 29):02d}/2027', 'finish': rng.choice(finishes),
+             'material': rng.choice(materials), 'notes': rng.choice(notes)} for _ in range(count)]
+
+
+def main():
+    print(f'{"travelers":>10} {"legacy (s)":>12} {"rules (s)":>12} {"rules/s":>12}')
+    for count in (100, 1000, 10000, 100000):
+        traveler_dictionaries = travelers(count)
+        start = time.perf_counter()
+        for traveler_dictionary in traveler_dictionaries:
+            legacy_due_date(traveler_dictionary)
+        legacy = time.perf_counter() - start
+        start = time.perf_counter()
+        XometryParsePDF.due_date_rules.due_dates(traveler_dictionaries)
+        rules = time.perf_counter() - start
+        print(f'{count:>10} {legacy:12.4f} {rules:12.4f} {count / rules:12.0f}')
+
+
+if __name__ == '__main__':
+    main()
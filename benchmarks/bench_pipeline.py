@@ -0,0 +1,246 @@
+#!usr/bin/env python3
+# bench_pipeline.py - times every stage of processing a folder on synthetic fixtures, from 10 to 10,000 files.
+# Each folder size runs in its own process so the peak RSS recorded for it is not inflated by the sizes before.
+# Results are written as JSON, pass a previous results file with --compare to see the change per stage.
+# usage: python benchmarks/bench_pipeline.py [--sizes 10 100 1000 10000] [--output FILE] [--compare FILE]
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import XometryParsePDF  # noqa: E402
+import fixtures  # noqa: E402
+
+STAGES = ['classify', 'parse', 'image', 'preview', 'workbook', 'rename', 'export', 'pipeline']
+
+
+def peak_rss():
+    """ Peak resident set size of this process in bytes, None where it can not be read. """
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    return None
+
+
+class Stage:
+    """ Times one stage, use as a context manager and count the items it handled. """
+
+    def __init__(self, results, name):
+        self.results = results
+        self.name = name
+        self.items = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        self.results[self.name] = {
+            'seconds': round(seconds, 6),
+            'items': self.items,
+            'items_per_second': round(self.items / seconds, 2) if seconds > 0 else None,
+        }
+
+
+def run_size(number_of_files, backend, jobs, cache, io_concurrency=None):
+    """ Runs every stage on a fresh folder of number_of_files fixtures, returns the result dictionary. """
+    # The fixtures are the same every run, a warm extraction cache would hide parsing regressions.
+    if not cache:
+        XometryParsePDF.extraction_cache.path = None
+    stages = {}
+    work_folder = Path(tempfile.mkdtemp(prefix='xometry_bench_'))
+    try:
+        folder_path = work_folder / 'stages'
+        counts = fixtures.make_folder(folder_path, number_of_files)
+        pdf_files = sorted(folder_path.glob('*.pdf'))
+
+        # Classify: drawing names are skipped unopened, every other PDF is opened and classified.
+        documents = []
+        with Stage(stages, 'classify') as stage:
+            for file in pdf_files:
+                stage.items += 1
+                if XometryParsePDF.FolderIndex.drawing_pattern.match(file.name) is not None:
+                    continue
+                document = XometryParsePDF.PdfDocument(file)
+                documents.append((XometryParsePDF.classify_document(document), document))
+
+        # Parse: text fields of travelers and the Part ID of POs.
+        with Stage(stages, 'parse') as stage:
+            for document_type, document in documents:
+                if document_type == XometryParsePDF.TRAVELER:
+                    XometryParsePDF.extract_traveler_fields(XometryParsePDF.open_parse_pdf(document))
+                elif document_type == XometryParsePDF.PURCHASE_ORDER:
+                    XometryParsePDF.purchase_order_process(document)
+                stage.items += 1
+
+        # Image: preview image of every traveler.
+        travelers = [document for document_type, document in documents if document_type == XometryParsePDF.TRAVELER]
+        images = []
+        with Stage(stages, 'image') as stage:
+            for document in travelers:
+                images.append(XometryParsePDF.image_grab(document))
+                stage.items += 1
+        for _, document in documents:
+            document.close()
+
+        # Preview: background replacement, resize and PNG encoding of every preview as one batch, in images/sec.
+        images = [image for image in images if image is not None]
+        with Stage(stages, 'preview') as stage:
+            XometryParsePDF.prepare_previews(images)
+            stage.items = len(images)
+
+        # Workbook: the traveler dictionaries are built untimed, only create_excel is measured.
+        results = [XometryParsePDF.process_document(file) for file in pdf_files]
+        with Stage(stages, 'workbook') as stage:
+            for document_type, _, value, _ in results:
+                if document_type == XometryParsePDF.TRAVELER:
+                    XometryParsePDF.create_excel(value, folder_path)
+                    stage.items += 1
+
+        # Rename: plan every drawing and traveler rename on a fresh folder scan, then apply them.
+        with Stage(stages, 'rename') as stage:
+            index = XometryParsePDF.FolderIndex(folder_path)
+            for document_type, filename, value, _ in results:
+                if document_type == XometryParsePDF.PURCHASE_ORDER:
+                    XometryParsePDF.rename_drawings(index, value)
+                elif document_type == XometryParsePDF.TRAVELER:
+                    XometryParsePDF.rename_drawings(index, value['job_number'])
+                    XometryParsePDF.rename_traveler(index, filename, value['job_number'])
+            XometryParsePDF.rename_unlinked_drawings(index)
+            stage.items = len(index.renames)
+            index.apply_renames()
+
+        # Export: every workbook to PDF with a single backend call.
+        conversions = [(workbook, workbook.with_name(workbook.stem + '_m.pdf'))
+                       for workbook in sorted(folder_path.glob('*.xlsx'))]
+        with Stage(stages, 'export') as stage:
+            XometryParsePDF.export_backends[backend](conversions)
+            stage.items = len(conversions)
+
+        # Pipeline: read_document and excel_to_pdf end to end on a second, untouched folder.
+        pipeline_path = work_folder / 'pipeline'
+        fixtures.make_folder(pipeline_path, number_of_files)
+        with Stage(stages, 'pipeline') as stage:
+            XometryParsePDF.read_document(pipeline_path, jobs=jobs, io_concurrency=io_concurrency)
+            XometryParsePDF.excel_to_pdf(pipeline_path, backend=backend)
+            stage.items = number_of_files
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    return {'files': number_of_files, **counts, 'stages': stages, 'peak_rss_bytes': peak_rss()}
+
+
+def git_commit():
+    """ Commit of the working tree being measured, None outside of a git checkout. """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous):
+    """ Prints the time of every stage against a previous results file, as a ratio of new over old. """
+    previous_sizes = {result['files']: result for result in previous['results']}
+    print(f'\ncompared to {previous.get("commit")} ({previous.get("date")}), new time / old time:')
+    for result in results:
+        old = previous_sizes.get(result['files'])
+        if old is None:
+            continue
+        ratios = []
+        for stage in STAGES:
+            new_seconds = result['stages'][stage]['seconds']
+            old_seconds = old['stages'].get(stage, {}).get('seconds')
+            ratios.append(f'{new_seconds / old_seconds:>9.2f}x' if old_seconds else f'{"-":>10}')
+        print(f'{result["files"]:>8} ' + ' '.join(ratios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Times every stage of processing a folder of synthetic files.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000], metavar='N',
+                        help='numbers of files per folder (default: 10 100 1000 10000)')
+    parser.add_argument('--export', choices=sorted(XometryParsePDF.export_backends), default='python',
+                        help='export backend to time (default: python)')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N', help='worker processes for the pipeline stage')
+    parser.add_argument('--cache', action='store_true', help='use the extraction cache in the pipeline stage')
+    parser.add_argument('--io-concurrency', type=int, default=None, metavar='N',
+                        help='concurrent reads and renames in the pipeline stage, see read_document_async')
+    parser.add_argument('--output', default='bench_pipeline_results.json', help='JSON results file to write')
+    parser.add_argument('--compare', metavar='FILE', help='previous JSON results file to compare against')
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child process for a single size, prints its result for the parent to collect.
+    if args.single is not None:
+        print(json.dumps(run_size(args.single, args.export, args.jobs, args.cache, args.io_concurrency)))
+        return
+
+    results = []
+    print(f'{"files":>8} ' + ' '.join(f'{stage:>10}' for stage in STAGES) + f' {"peak MB":>10}')
+    for number_of_files in args.sizes:
+        command = [sys.executable, os.path.abspath(__file__), '--single', str(number_of_files),
+                   '--export', args.export, '--jobs', str(args.jobs)]
+        if args.cache:
+            command.append('--cache')
+        if args.io_concurrency:
+            command += ['--io-concurrency', str(args.io_concurrency)]
+        child = subprocess.run(command, capture_output=True, text=True, check=True)
+        result = json.loads(child.stdout.splitlines()[-1])
+        results.append(result)
+        peak = f'{result["peak_rss_bytes"] / 2 ** 20:10.1f}' if result['peak_rss_bytes'] else f'{"-":>10}'
+        print(f'{number_of_files:>8} ' + ' '.join(f'{result["stages"][stage]["seconds"]:10.3f}' for stage in STAGES)
+              + f' {peak}')
+
+    report = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'export_backend': args.export,
+        'jobs': args.jobs,
+        'cache': args.cache,
+        'io_concurrency': args.io_concurrency,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as output_file:
+        json.dump(report, output_file, indent=1)
+    print(f'Results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as previous_file:
+            compare(results, json.load(previous_file))
+
+
+if __name__ == '__main__':
+    main()
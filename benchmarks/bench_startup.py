@@ -0,0 +1,137 @@
+#!usr/bin/env python3
+# bench_startup.py - times the cold start of XometryParsePDF: the import alone, --help, and parsing a single file.
+# Every run is a fresh interpreter. The import is also run with -X importtime to list the slowest imports and to
+# check the heavy dependencies (PDF, excel, numpy, images, win32) are not loaded before they are needed.
+# usage: python benchmarks/bench_startup.py [--runs 10] [--output FILE] [--compare FILE]
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fixtures  # noqa: E402
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'XometryParsePDF.py')
+
+# Modules only some runs need, none of them should be imported by the import of the script alone.
+HEAVY_MODULES = ['PyPDF2', 'openpyxl', 'numpy', 'PIL', 'asyncio', 'win32com', 'win32api']
+
+# Number of slowest imports listed from the -X importtime report.
+SLOWEST_IMPORTS = 10
+
+
+def import_command():
+    """ Command importing the script and nothing else. """
+    setup = f'import sys; sys.path.insert(0, {os.path.dirname(SCRIPT)!r})'
+    return [sys.executable, '-c', f'{setup}; import XometryParsePDF']
+
+
+def time_command(command, runs):
+    """ Median and best wall time in seconds of running a command in a fresh interpreter. """
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        seconds.append(time.perf_counter() - start)
+    return {'median': round(statistics.median(seconds), 6), 'best': round(min(seconds), 6)}
+
+
+def import_report():
+    """ Parses the -X importtime report of importing the script.
+        Returns the cumulative microseconds of the script import, the slowest imports and the heavy modules loaded. """
+    child = subprocess.run([sys.executable, '-X', 'importtime'] + import_command()[1:], capture_output=True,
+                           text=True, check=True)
+    imports = []
+    for line in child.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two more spaces per level.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(cumulative), depth))
+
+    # Only the imports of the script itself are listed, their cumulative time already holds what they import.
+    top_level = [(name, microseconds) for name, microseconds, depth in imports if depth == 1]
+    top_level.sort(key=lambda item: item[1], reverse=True)
+    loaded = {name.split('.')[0] for name, _, _ in imports}
+    return {
+        'script_import_us': next((microseconds for name, microseconds, _ in imports if name == 'XometryParsePDF'),
+                                 None),
+        'slowest': [{'module': name, 'cumulative_us': microseconds} for name, microseconds in
+                    top_level[:SLOWEST_IMPORTS]],
+        'heavy_modules_loaded': [module for module in HEAVY_MODULES if module in loaded],
+    }
+
+
+def compare(report, previous):
+    """ Prints every timing against a previous results file, as a ratio of new over old. """
+    print(f'\ncompared to {previous.get("commit")} ({previous.get("date")}), new time / old time:')
+    for name, timing in report['timings'].items():
+        old = previous['timings'].get(name)
+        ratio = f'{timing["median"] / old["median"]:.2f}x' if old else '-'
+        print(f'{name:>10} {ratio:>8}')
+
+
+def git_commit():
+    """ Commit of the working tree being measured, None outside of a git checkout. """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(SCRIPT)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Times the cold start of XometryParsePDF in fresh interpreters.')
+    parser.add_argument('--runs', type=int, default=10, metavar='N', help='runs of every command (default: 10)')
+    parser.add_argument('--output', default='bench_startup_results.json', help='JSON results file to write')
+    parser.add_argument('--compare', metavar='FILE', help='previous JSON results file to compare against')
+    args = parser.parse_args()
+
+    # A single traveler to parse, the extraction cache is turned off so every run really parses it.
+    with tempfile.TemporaryDirectory(prefix='xometry_startup_') as folder:
+        fixtures.make_folder(folder, 1)
+        traveler = os.path.join(folder, os.listdir(folder)[0])
+        commands = {
+            'import': import_command(),
+            'help': [sys.executable, SCRIPT, '--help'],
+            'parse': [sys.executable, SCRIPT, 'parse', '--no-cache', '--json', traveler],
+        }
+        timings = {name: time_command(command, args.runs) for name, command in commands.items()}
+    imports = import_report()
+
+    print(f'{"command":>10} {"median ms":>10} {"best ms":>10}')
+    for name, timing in timings.items():
+        print(f'{name:>10} {timing["median"] * 1000:10.1f} {timing["best"] * 1000:10.1f}')
+    print(f'\nimport of the script alone: {imports["script_import_us"] / 1000:.1f} ms, slowest imports:')
+    for entry in imports['slowest']:
+        print(f'{entry["cumulative_us"] / 1000:10.1f} ms  {entry["module"]}')
+    print(f'heavy modules loaded by the import: {", ".join(imports["heavy_modules_loaded"]) or "none"}')
+
+    report = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': args.runs,
+        'timings': timings,
+        'imports': imports,
+    }
+    with open(args.output, 'w', encoding='utf-8') as output_file:
+        json.dump(report, output_file, indent=1)
+    print(f'Results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as previous_file:
+            compare(report, json.load(previous_file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!usr/bin/env python3
+# bench_traveler_extractor.py - times traveler field extraction on pathological text that never matches.
+# The old single regex of lazy groups backtracks through every combination of repeated labels, the anchor based
+# extract_traveler_fields and roughness_search only move forward, so their runtime grows linearly.
+# usage: python benchmarks/bench_traveler_extractor.py
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import XometryParsePDF  # noqa: E402
+
+# The regex traveler_process used before extract_traveler_fields, kept here as the baseline.
+legacy_pattern = re.compile(r'''
+    .*?DateContact
+    ([a-zA-Z]\w{7})\n?
+    (\d\d/\d\d/\d\d\d\d)
+    (.*?@.*?\.com)
+    .*?
+    Quantity
+    (0\w{6})
+    (.*?)
+    (\.\n?sldprt|\.\n?SLDPRT|\.\n?step|\.\n?STEP|\.\n?stp|\.\n?STP|\.\n?x_t|\.\n?s\n?tp|\.\n?prt)
+    .*?
+    (\d+)
+    .*?
+    tions
+    (.*?[a-z])
+    (\n?[A-Z\d].*?)
+    (\n-.*?|Cert.*?)\n?
+    Inspection.*?[a-z]
+    ([A-Z].*?)
+    (Features:.*)
+    ''', re.VERBOSE | re.DOTALL)
+legacy_roughness_pattern = re.compile(
+    r'.*Surface Roughness: \n.*?ish (\d.*?)(?:Ra, )(speci\nc area|entire part).*?(?:Part|Notes).*', re.DOTALL)
+
+# Each repetition adds another candidate for every lazy group, and there is no 'Inspection' label to end on.
+traveler_header = 'Purchase OrderDue DateContactXM123456\n01/15/2027'
+traveler_repeat = 'x@y.com Quantity0ABCDEFpart.step 5 tionsStandard\nAl\n- Cert\n'
+
+# Many roughness labels and values, but no 'Ra, ' area to end on.
+notes_repeat = 'Surface Roughness: \nAs-machined finish 125 Ra \n'
+
+
+def time_call(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def extract(text):
+    try:
+        XometryParsePDF.extract_traveler_fields(text)
+    except ValueError:
+        pass
+
+
+def main():
+    print(f'{"repetitions":>12} {"chars":>10} {"legacy (s)":>12} {"anchored (s)":>14}')
+    for repetitions in (4, 8, 12, 100, 1000, 10000):
+        text = traveler_header + traveler_repeat * repetitions
+
+        # Legacy regex time roughly multiplies by 100 for every 4 repetitions, only time the small sizes.
+        legacy = f'{time_call(legacy_pattern.match, text):12.6f}' if repetitions <= 12 else f'{"skipped":>12}'
+        print(f'{repetitions:>12} {len(text):>10} {legacy} {time_call(extract, text):14.6f}')
+
+    print()
+    print(f'{"roughness":>12} {"chars":>10} {"legacy (s)":>12} {"anchored (s)":>14}')
+    for repetitions in (10, 20, 40, 1000, 10000, 100000):
+        text = notes_repeat * repetitions + 'Notes:'
+
+        # Legacy regex time grows with the cube of the repetitions, only time the small sizes.
+        legacy = f'{time_call(legacy_roughness_pattern.search, text):12.6f}' if repetitions <= 40 else f'{"skipped":>12}'
+        print(f'{repetitions:>12} {len(text):>10} {legacy} {time_call(XometryParsePDF.roughness_search, text):14.6f}')
+
+
+if __name__ == '__main__':
+    main()
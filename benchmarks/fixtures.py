@@ -0,0 +1,181 @@
+#!usr/bin/env python3
+# fixtures.py - writes synthetic Xometry travelers, purchase orders and customer drawings for the benchmarks.
+# The PDFs are written by hand, page text is laid out so PyPDF2's extractText gives the same text as a real
+# traveler, and travelers carry a logo plus a FlateDecode part preview for image_grab.
+# usage: python benchmarks/fixtures.py FOLDER NUMBER_OF_FILES
+
+import os
+import random
+import sys
+import zlib
+
+from PyPDF2.generic import encode_pdfdocencoding
+
+# Every group of files holds a traveler, its PO and drawings, most files in a real drop folder are drawings.
+GROUP_SIZE = 5
+
+# Size of the part preview image on the traveler, image_grab keeps images taller than 100 pixels.
+PREVIEW_WIDTH = 200
+PREVIEW_HEIGHT = 150
+
+finishes = ['Standard', 'Bead Blast', 'Anodize Type II Clear', 'Custom Black Oxide', 'Powder Coat Matte Black']
+materials = ['Aluminum 6061-T6', 'Stainless Steel 304', 'Delrin Acetal Homopolymer', 'Brass C360']
+extensions = ['step', 'STEP', 'sldprt', 'stp', 'x_t']
+
+
+def escape(string):
+    """ Escapes a string for a PDF literal string. """
+    return string.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def build_pdf(pages, images=()):
+    """
+    Writes a PDF with one line of Helvetica text per string, every content stream compressed with FlateDecode.
+    :pages: list of pages, each a list of text lines
+    :images: (name, width, height, RGB bytes) tuples drawn on the first page
+    :return: the PDF file as bytes
+    """
+    objects = []
+
+    def add(data):
+        objects.append(data)
+        return len(objects)
+
+    catalog = add(None)
+    pages_id = add(None)
+    font = add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+
+    image_ids = {}
+    for name, width, height, data in images:
+        compressed = zlib.compress(data)
+        image_ids[name] = add(b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB '
+                              b'/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n'
+                              % (width, height, len(compressed)) + compressed + b'\nendstream')
+
+    kids = []
+    for page_number, lines in enumerate(pages):
+        # Each line is shown with Tj then moved down with T*, which extractText turns into a newline.
+        operators = [b'BT /F1 9 Tf 40 760 Td 11 TL']
+        operators += [b'(' + encode_pdfdocencoding(escape(line)) + b') Tj T*' for line in lines]
+        operators.append(b'ET')
+        resources = b'/Font << /F1 %d 0 R >>' % font
+        if page_number == 0 and images:
+            for image_number, (name, width, height, _) in enumerate(images):
+                operators.append(b'q %d 0 0 %d 300 %d cm /%s Do Q'
+                                 % (width, height, 500 - 200 * image_number, name.encode()))
+            resources += b' /XObject << ' + b' '.join(b'/%s %d 0 R' % (name.encode(), object_id)
+                                                     for name, object_id in image_ids.items()) + b' >>'
+
+        content = zlib.compress(b'\n'.join(operators))
+        content_id = add(b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(content) + content + b'\nendstream')
+        kids.append(add(b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Resources << %s >> /Contents %d 0 R >>'
+                        % (pages_id, resources, content_id)))
+
+    objects[catalog - 1] = b'<< /Type /Catalog /Pages %d 0 R >>' % pages_id
+    objects[pages_id - 1] = (b'<< /Type /Pages /Kids [%s] /Count %d >>'
+                             % (b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)))
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for object_id, data in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % object_id + data + b'\nendobj\n'
+    xref = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        output += b'%010d 00000 n \n' % offset
+    output += b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, catalog, xref)
+    return bytes(output)
+
+
+def preview_image(rng):
+    """ RGB bytes of a part preview: a colored part on a black background, like Xometry renders them. """
+    image = bytearray(PREVIEW_WIDTH * PREVIEW_HEIGHT * 3)
+    color = bytes(rng.randrange(60, 220) for _ in range(3))
+    left, top = rng.randrange(20, 60), rng.randrange(20, 40)
+    right, bottom = rng.randrange(140, 180), rng.randrange(100, 130)
+    for y in range(top, bottom):
+        image[(y * PREVIEW_WIDTH + left) * 3:(y * PREVIEW_WIDTH + right) * 3] = color * (right - left)
+    return bytes(image)
+
+
+def traveler_pdf(job_number, rng):
+    """ Two page customer traveler for the given Part ID, the fields vary with rng. """
+    po_number = f'{rng.randrange(100000, 999999)}'
+    due_date = f'{rng.randrange(1, 13):02d}/{rng.randrange(1, 29):02d}/2027'
+    page_1 = [
+        f'Purchase OrderDue DateContactXM{po_number}',
+        f'{due_date}jane.doe{rng.randrange(100)}@xometry.com',
+        f'Part IDPart NameQuantity{job_number}bracket_{rng.randrange(1000)}.{rng.choice(extensions)}',
+        f'{rng.randrange(1, 500)}',
+        'Finish Material Certifica',
+        f'tions{rng.choice(finishes)}',
+        rng.choice(materials),
+        '- Material certication',
+        'Inspection RequirementsStandard Inspection',
+    ]
+    page_2 = [
+        'Features:',
+        'Threads/Tapped Holes: ', f'{rng.randrange(10)}',
+        'Inserts: ', f'{rng.randrange(3)}',
+        'Tolerances: ', '+/- 0.005',
+        'Surface Roughness: ', f'As-machined finish {rng.choice([63, 125, 250])} Ra, entire part',
+        'Part Markings: ', 'None',
+        'Notes:', 'Ł Deburr all edges. Xometry™ spec.',
+    ]
+    logo = bytes([200, 0, 0]) * (60 * 20)
+    return build_pdf([page_1, page_2], [('Im1', 60, 20, logo),
+                                        ('Im2', PREVIEW_WIDTH, PREVIEW_HEIGHT, preview_image(rng))])
+
+
+def purchase_order_pdf(job_number, rng, appendix_pages=1):
+    """ Xometry purchase order for the given Part ID, followed by pages of terms and conditions. """
+    page_1 = ['PURCHASE ORDER', 'Xometry, 7951 Cessna Avenue', f'PO {rng.randrange(100000, 999999)}', 'Qty.',
+              job_number, f'{rng.randrange(1, 500)}', 'Terms and conditions follow.']
+    terms = [f'{line}. The supplier shall comply with every requirement of this purchase order.'
+             for line in range(60)]
+    return build_pdf([page_1] + [terms] * appendix_pages)
+
+
+def drawing_pdf(rng):
+    """ Customer drawing, a few lines of title block text. """
+    return build_pdf([['DRAWING', f'REV {rng.choice("ABC")}', f'SCALE 1:{rng.randrange(1, 5)}',
+                       'UNLESS OTHERWISE SPECIFIED DIMENSIONS ARE IN INCHES']])
+
+
+def drawing_name(job_number, rng):
+    """ Drawing filename with the long alphanumeric Xometry adds, as FolderIndex.drawing_pattern expects. """
+    return f'{job_number}_r_drawing_d_{rng.getrandbits(48):012x}r_{rng.choice("ABCDEF")}.pdf'
+
+
+def make_folder(folder_path, number_of_files, seed=0):
+    """
+    Fills a folder with number_of_files synthetic files, in groups of a traveler, a PO and three drawings.
+    :return: dictionary with the number of travelers, purchase orders and drawings written
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder_path, exist_ok=True)
+    counts = {'travelers': 0, 'purchase_orders': 0, 'drawings': 0}
+    group = 0
+    while sum(counts.values()) < number_of_files:
+        traveler_job = f'0A{group:05d}'
+        po_job = f'0B{group:05d}'
+        files = [
+            ('travelers', f'{rng.getrandbits(32):08x}_traveler.pdf', lambda: traveler_pdf(traveler_job, rng)),
+            ('drawings', drawing_name(traveler_job, rng), lambda: drawing_pdf(rng)),
+            ('purchase_orders', f'PO_{po_job}.pdf', lambda: purchase_order_pdf(po_job, rng)),
+            ('drawings', drawing_name(traveler_job, rng), lambda: drawing_pdf(rng)),
+            ('drawings', drawing_name(po_job, rng), lambda: drawing_pdf(rng)),
+        ]
+        for kind, filename, make in files[:number_of_files - sum(counts.values())]:
+            with open(os.path.join(folder_path, filename), 'wb') as pdf_file_obj:
+                pdf_file_obj.write(make())
+            counts[kind] += 1
+        group += 1
+    return counts
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('usage: python benchmarks/fixtures.py FOLDER NUMBER_OF_FILES')
+    print(make_folder(sys.argv[1], int(sys.argv[2])))